@@ -0,0 +1,219 @@
+'''Общая обвязка HTTP-функций: маршрутизация, авторизация, сборка ответов.
+
+Одинаковая копия модуля лежит в каталоге каждой функции. Соединение с базой
+берётся из пула только при первом обращении к request.cursor, поэтому OPTIONS,
+ответы из кэша и ошибки валидации не трогают ни базу, ни psycopg2.
+'''
+import base64
+import importlib.util
+import json
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import tracing
+
+
+def lazy_import(name: str):
+    '''Модуль загружается при первом обращении к его атрибуту — меньше работы на холодном старте.
+
+    Только для модулей верхнего уровня: поиск spec подмодуля импортирует родительский пакет.
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# db импортирует psycopg2, поэтому запросы без базы обходятся без загрузки драйвера
+db = lazy_import('db')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload) -> str:
+    with tracing.span('serialize'):
+        if orjson is not None:
+            return orjson.dumps(payload, default=_json_default).decode()
+        return json.dumps(payload, default=_json_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def response(status: int, payload=None, headers: dict = None, body: str = None) -> dict:
+    '''payload сериализуется в JSON; готовое тело можно передать в body'''
+    if body is None:
+        body = '' if payload is None else dumps(payload)
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else JSON_HEADERS,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+
+def error(status: int, message: str) -> dict:
+    return response(status, {'error': message})
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, event: dict, context):
+        self.event = event
+        self.context = context
+        self.method = event.get('httpMethod', 'GET')
+        self.params = event.get('queryStringParameters') or {}
+        self.headers = event.get('headers') or {}
+        self.session = None
+        self._body = None
+        self._conn = None
+        self._cursor = None
+
+    def header(self, name: str, default: str = '') -> str:
+        value = self.headers.get(name)
+        if value is None:
+            value = self.headers.get(name.lower())
+        return default if value is None else value
+
+    @property
+    def text(self) -> str:
+        body = self.event.get('body') or ''
+        if self.event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        return body
+
+    @property
+    def body(self) -> dict:
+        if self._body is None:
+            try:
+                self._body = loads(self.text or '{}')
+            except ValueError:
+                raise HttpError(400, 'Некорректный JSON в теле запроса')
+        return self._body
+
+    @property
+    def token(self) -> str:
+        return self.header('X-Authorization').replace('Bearer ', '')
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = db.get_db_connection()
+        return self._conn
+
+    @property
+    def cursor(self):
+        if self._cursor is None:
+            from psycopg2.extras import RealDictCursor
+            self._cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+        return self._cursor
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+        if self._conn is not None:
+            db.release_db_connection(self._conn)
+        self._cursor = self._conn = None
+
+
+class Router:
+    '''Таблица маршрутов (метод, action) -> функция(request) -> ответ.
+
+    action берётся из параметра запроса action, а для POST без него — из поля action JSON-тела
+    (так работает функция auth). Маршрут с action=None обслуживает запросы без action.
+    '''
+
+    def __init__(self, methods: str, client_errors: tuple = (), authenticate=None,
+                 allow_headers: str = 'Content-Type, X-Authorization', body_actions: bool = False):
+        self.routes = {}
+        self.client_errors = client_errors
+        self.authenticate = authenticate
+        self.body_actions = body_actions
+        self.cors_headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': '86400'
+        }
+
+    def route(self, method: str, action: str = None, auth: bool = False):
+        def decorator(func):
+            self.routes[(method, action)] = (func, auth)
+            return func
+        return decorator
+
+    def _action(self, request: Request):
+        action = request.params.get('action')
+        if action is None and self.body_actions and request.method == 'POST':
+            body = request.body
+            action = body.get('action') if isinstance(body, dict) else None
+        return action
+
+    def dispatch(self, event: dict, context) -> dict:
+        request = Request(event, context)
+        if request.method == 'OPTIONS':
+            return {'statusCode': 200, 'headers': self.cors_headers, 'body': '', 'isBase64Encoded': False}
+
+        trace = tracing.start(request.method, request.params.get('action'), context)
+        try:
+            action = self._action(request)
+            trace.action = action
+            route = self.routes.get((request.method, action))
+            if route is None:
+                if (request.method, None) in self.routes and action is None:
+                    route = self.routes[(request.method, None)]
+                elif any(method == request.method for method, _ in self.routes):
+                    raise HttpError(400, 'Invalid action')
+                else:
+                    raise HttpError(405, 'Method not allowed')
+
+            func, auth = route
+            if auth:
+                if not request.token:
+                    raise HttpError(401, 'Требуется авторизация')
+                request.session = self.authenticate(request)
+                if not request.session:
+                    raise HttpError(401, 'Сессия истекла')
+            result = func(request)
+        except HttpError as e:
+            result = error(e.status, e.message)
+        except self.client_errors as e:
+            result = error(400, str(e))
+        except Exception as e:
+            # Клиент получает только текст, тип и стек уходят в трассу
+            trace.record_exception(e)
+            result = error(500, str(e))
+        finally:
+            request.close()
+        return tracing.finish(trace, result)
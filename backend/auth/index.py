@@ -1,253 +1,169 @@
-import json
-import os
 import hashlib
 import secrets
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from api import Router, HttpError, response
+from sessions import resolve_session, invalidate_session
+from tokens import signed_mode_enabled, issue_signed_token, is_signed_token, revoke_signed_token
+from maintenance import maintenance_authorized, purge_expired_sessions
+from ratelimit import check_rate_limit, rate_limit_stats
 
-def handler(event, context):
-    """API для регистрации и авторизации пользователей"""
+SESSION_TTL_DAYS = 30
+
+router = Router('POST, OPTIONS', body_actions=True)
+
+def create_session(cur, user) -> str:
+    """Выдаёт токен сессии: подписанный в режиме SESSION_TOKEN_MODE=signed, иначе запись в user_sessions"""
+    if signed_mode_enabled():
+        session_token, _ = issue_signed_token(user['id'], user['user_type'], SESSION_TTL_DAYS * 86400)
+        return session_token
     
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
+    session_token = secrets.token_urlsafe(32)
+    expires_at = datetime.now() + timedelta(days=SESSION_TTL_DAYS)
+    cur.execute(
+        "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
+        (user['id'], session_token, expires_at)
+    )
+    return session_token
+
+def too_many_attempts(retry_after: int) -> dict:
+    return response(429, {'error': 'Слишком много попыток, повторите позже', 'retry_after': retry_after},
+                    headers={'Retry-After': str(retry_after), 'Access-Control-Expose-Headers': 'Retry-After'})
+
+def user_response(user: dict, user_id: int, session_token: str = None) -> dict:
+    payload = {
+        'success': True,
+        'user': {
+            'id': user_id,
+            'email': user['email'],
+            'full_name': user['full_name'],
+            'user_type': user['user_type']
         }
+    }
+    if session_token is not None:
+        payload['session_token'] = session_token
+    return response(200, payload)
+
+@router.route('POST', 'register')
+def register(request):
+    body = request.body
+    email = body.get('email', '').strip().lower()
+    password = body.get('password', '')
+    full_name = body.get('full_name', '').strip()
+    phone = body.get('phone', '').strip()
+    user_type = body.get('user_type', 'renter')
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+    if not email or not password or not full_name:
+        raise HttpError(400, 'Email, password and full name are required')
+    
+    if len(password) < 6:
+        raise HttpError(400, 'Password must be at least 6 characters')
+    
+    retry_after = check_rate_limit(request, 'register', email)
+    if retry_after:
+        return too_many_attempts(retry_after)
+    
+    cur = request.cursor
+    cur.execute("SELECT id FROM users WHERE email = %s", (email,))
+    if cur.fetchone():
+        raise HttpError(400, 'User with this email already exists')
+    
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    
+    cur.execute(
+        "INSERT INTO users (email, password_hash, full_name, phone, user_type) VALUES (%s, %s, %s, %s, %s) RETURNING id, email, full_name, user_type, created_at",
+        (email, password_hash, full_name, phone, user_type)
+    )
+    user = cur.fetchone()
+    request.conn.commit()
+    
+    session_token = create_session(cur, user)
+    request.conn.commit()
+    
+    return user_response(user, user['id'], session_token)
+
+@router.route('POST', 'login')
+def login(request):
+    body = request.body
+    email = body.get('email', '').strip().lower()
+    password = body.get('password', '')
+    
+    if not email or not password:
+        raise HttpError(400, 'Email and password are required')
+    
+    retry_after = check_rate_limit(request, 'login', email)
+    if retry_after:
+        return too_many_attempts(retry_after)
+    
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
     
-    try:
-        body = json.loads(event.get('body', '{}'))
-        action = body.get('action')
-        
-        dsn = os.environ.get('DATABASE_URL')
-        schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-        if not dsn:
-            return {
-                'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Database connection not configured'}),
-                'isBase64Encoded': False
-            }
-        
-        conn = psycopg2.connect(dsn, options=f'-c search_path={schema}')
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if action == 'register':
-            email = body.get('email', '').strip().lower()
-            password = body.get('password', '')
-            full_name = body.get('full_name', '').strip()
-            phone = body.get('phone', '').strip()
-            user_type = body.get('user_type', 'renter')
-            
-            if not email or not password or not full_name:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Email, password and full name are required'}),
-                    'isBase64Encoded': False
-                }
-            
-            if len(password) < 6:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Password must be at least 6 characters'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute("SELECT id FROM users WHERE email = %s", (email,))
-            if cur.fetchone():
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'User with this email already exists'}),
-                    'isBase64Encoded': False
-                }
-            
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            
-            cur.execute(
-                "INSERT INTO users (email, password_hash, full_name, phone, user_type) VALUES (%s, %s, %s, %s, %s) RETURNING id, email, full_name, user_type, created_at",
-                (email, password_hash, full_name, phone, user_type)
-            )
-            user = cur.fetchone()
-            conn.commit()
-            
-            session_token = secrets.token_urlsafe(32)
-            expires_at = datetime.now() + timedelta(days=30)
-            
-            cur.execute(
-                "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
-                (user['id'], session_token, expires_at)
-            )
-            conn.commit()
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'user': {
-                        'id': user['id'],
-                        'email': user['email'],
-                        'full_name': user['full_name'],
-                        'user_type': user['user_type']
-                    },
-                    'session_token': session_token
-                }, default=str),
-                'isBase64Encoded': False
-            }
-        
-        elif action == 'login':
-            email = body.get('email', '').strip().lower()
-            password = body.get('password', '')
-            
-            if not email or not password:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Email and password are required'}),
-                    'isBase64Encoded': False
-                }
-            
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            
-            cur.execute(
-                "SELECT id, email, full_name, user_type FROM users WHERE email = %s AND password_hash = %s",
-                (email, password_hash)
-            )
-            user = cur.fetchone()
-            
-            if not user:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Invalid email or password'}),
-                    'isBase64Encoded': False
-                }
-            
-            session_token = secrets.token_urlsafe(32)
-            expires_at = datetime.now() + timedelta(days=30)
-            
-            cur.execute(
-                "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
-                (user['id'], session_token, expires_at)
-            )
-            conn.commit()
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'user': {
-                        'id': user['id'],
-                        'email': user['email'],
-                        'full_name': user['full_name'],
-                        'user_type': user['user_type']
-                    },
-                    'session_token': session_token
-                }, default=str),
-                'isBase64Encoded': False
-            }
-        
-        elif action == 'verify':
-            token = body.get('session_token', '')
-            
-            if not token:
-                cur.close()
-                conn.close()
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Session token required'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute(
-                """
-                SELECT u.id, u.email, u.full_name, u.user_type, s.expires_at
-                FROM user_sessions s
-                JOIN users u ON s.user_id = u.id
-                WHERE s.session_token = %s AND s.expires_at > NOW()
-                """,
-                (token,)
-            )
-            session = cur.fetchone()
-            
-            cur.close()
-            conn.close()
-            
-            if not session:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Invalid or expired session'}),
-                    'isBase64Encoded': False
-                }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'user': {
-                        'id': session['id'],
-                        'email': session['email'],
-                        'full_name': session['full_name'],
-                        'user_type': session['user_type']
-                    }
-                }, default=str),
-                'isBase64Encoded': False
-            }
-        
-        else:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid action'}),
-                'isBase64Encoded': False
-            }
-    
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+    cur = request.cursor
+    cur.execute(
+        "SELECT id, email, full_name, user_type FROM users WHERE email = %s AND password_hash = %s",
+        (email, password_hash)
+    )
+    user = cur.fetchone()
+    
+    if not user:
+        raise HttpError(401, 'Invalid email or password')
+    
+    session_token = create_session(cur, user)
+    request.conn.commit()
+    
+    return user_response(user, user['id'], session_token)
+
+@router.route('POST', 'verify')
+def verify(request):
+    token = request.body.get('session_token', '')
+    
+    if not token:
+        raise HttpError(401, 'Session token required')
+    
+    cur = request.cursor
+    session = resolve_session(cur, token)
+    
+    if not session:
+        raise HttpError(401, 'Invalid or expired session')
+    
+    if session['email'] is None:
+        # Подписанный токен не несёт профиль пользователя
+        cur.execute("SELECT email, full_name FROM users WHERE id = %s", (session['user_id'],))
+        user = cur.fetchone()
+        if not user:
+            # Токен подписан верно, но пользователь уже удалён
+            raise HttpError(401, 'Invalid or expired session')
+        session = {**session, **user}
+    
+    return user_response(session, session['user_id'])
+
+@router.route('POST', 'logout')
+def logout(request):
+    token = request.body.get('session_token', '')
+    
+    if token and is_signed_token(token):
+        revoke_signed_token(request.cursor, token)
+        request.conn.commit()
+    elif token:
+        request.cursor.execute("DELETE FROM user_sessions WHERE session_token = %s", (token,))
+        request.conn.commit()
+        invalidate_session(token)
+    
+    return response(200, {'success': True})
+
+@router.route('POST', 'purge_sessions')
+def purge_sessions(request):
+    if not maintenance_authorized(request.event):
+        raise HttpError(403, 'Forbidden')
+    
+    result = purge_expired_sessions(request.conn, request.cursor)
+    return response(200, {'success': True, **result})
+
+@router.route('POST', 'rate_limit_stats')
+def get_rate_limit_stats(request):
+    if not maintenance_authorized(request.event):
+        raise HttpError(403, 'Forbidden')
+    
+    return response(200, rate_limit_stats())
+
+def handler(event, context):
+    """API для регистрации и авторизации пользователей"""
+    return router.dispatch(event, context)
@@ -0,0 +1,43 @@
+'''Служебные задачи функции auth, запускаемые по расписанию'''
+import hmac
+import os
+
+PURGE_CHUNK_SIZE = int(os.environ.get('SESSION_PURGE_CHUNK_SIZE', '1000'))
+
+
+def maintenance_authorized(event: dict) -> bool:
+    '''Служебные действия доступны только с заголовком X-Maintenance-Key, равным MAINTENANCE_KEY'''
+    expected = os.environ.get('MAINTENANCE_KEY')
+    provided = (event.get('headers') or {}).get('X-Maintenance-Key', '')
+    return bool(expected) and hmac.compare_digest(expected, provided)
+
+
+def purge_expired_sessions(conn, cur, chunk_size: int = PURGE_CHUNK_SIZE, max_chunks: int = 100) -> dict:
+    '''Удаляет истёкшие сессии и отзывы токенов порциями, коммитя каждую порцию отдельно,
+    чтобы не держать длинных блокировок на user_sessions'''
+    sessions_deleted = 0
+    for _ in range(max_chunks):
+        cur.execute(
+            """DELETE FROM user_sessions WHERE id IN (
+                   SELECT id FROM user_sessions WHERE expires_at < NOW()
+                   ORDER BY expires_at LIMIT %s FOR UPDATE SKIP LOCKED
+               )""",
+            (chunk_size,)
+        )
+        deleted = cur.rowcount
+        conn.commit()
+        sessions_deleted += deleted
+        if deleted < chunk_size:
+            break
+
+    cur.execute("DELETE FROM revoked_session_tokens WHERE expires_at < NOW()")
+    revocations_deleted = cur.rowcount
+    conn.commit()
+
+    # Счётчики ограничения попыток нужны только на два окна
+    cur.execute("DELETE FROM rate_limit_counters WHERE expires_at < NOW()")
+    counters_deleted = cur.rowcount
+    conn.commit()
+
+    return {'sessions_deleted': sessions_deleted, 'revocations_deleted': revocations_deleted,
+            'rate_limit_counters_deleted': counters_deleted}
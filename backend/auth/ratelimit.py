@@ -0,0 +1,182 @@
+'''Ограничение частоты попыток входа и регистрации по IP и email.
+
+Скользящее окно приближается двумя фиксированными: оценка = текущее окно +
+предыдущее × доля окна, ещё не ушедшая в прошлое. Счётчики лежат в хранилище:
+MemoryStore — в памяти инстанса, PostgresStore — в UNLOGGED-таблице rate_limit_counters
+(V0016), общей для всех инстансов функции. В режиме postgres счётчик в памяти
+всё равно ведётся: инстанс, уже видевший превышение, отказывает без запроса к базе.
+Проверка выполняется до обращения к users.
+'''
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# memory — только в памяти инстанса; postgres — общие счётчики в базе
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'postgres')
+MEMORY_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MEMORY_KEYS', '100000'))
+
+
+def _rule(name: str, default: str) -> tuple:
+    '''"лимит/окно в секундах" из RATE_LIMIT_<NAME>'''
+    limit, window = os.environ.get(f'RATE_LIMIT_{name}', default).split('/')
+    return int(limit), int(window)
+
+
+# действие -> [(измерение, лимит, окно в секундах)]
+RULES = {
+    'login': [('ip', *_rule('LOGIN_IP', '30/60')), ('email', *_rule('LOGIN_EMAIL', '10/300'))],
+    'register': [('ip', *_rule('REGISTER_IP', '10/3600'))],
+}
+
+
+class MemoryStore:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _increment(self, key: str, window_start: int, window: int) -> tuple:
+        current_key = (key, window_start)
+        count = self._counts.pop(current_key, 0) + 1
+        self._counts[current_key] = count
+        while len(self._counts) > self.max_keys:
+            self._counts.popitem(last=False)
+        return count, self._counts.get((key, window_start - window), 0)
+
+    def hit(self, hits: list) -> list:
+        '''hits — [(ключ, начало окна, окно)]; возвращает [(текущее, предыдущее)]'''
+        with self._lock:
+            return [self._increment(key, window_start, window) for key, window_start, window in hits]
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._counts)
+
+
+class PostgresStore:
+    HIT_SQL = """
+        WITH input AS (
+            SELECT * FROM unnest(%s::text[], %s::bigint[], %s::int[]) AS t(key, window_start, window_seconds)
+        ), hit AS (
+            INSERT INTO rate_limit_counters (key, window_start, count, expires_at)
+            SELECT key, window_start, 1, to_timestamp(window_start + 2 * window_seconds) FROM input
+            ON CONFLICT (key, window_start) DO UPDATE SET count = rate_limit_counters.count + 1
+            RETURNING key, count
+        )
+        SELECT i.key, h.count, COALESCE(p.count, 0) AS previous
+        FROM input i
+        JOIN hit h ON h.key = i.key
+        LEFT JOIN rate_limit_counters p ON p.key = i.key AND p.window_start = i.window_start - i.window_seconds
+    """
+
+    def __init__(self, conn, cur):
+        self.conn = conn
+        self.cur = cur
+
+    def hit(self, hits: list) -> list:
+        '''Все ключи одного запроса — одним запросом и отдельным коммитом'''
+        self.cur.execute(self.HIT_SQL, ([h[0] for h in hits], [h[1] for h in hits], [h[2] for h in hits]))
+        counts = {row['key']: (row['count'], row['previous']) for row in self.cur.fetchall()}
+        self.conn.commit()
+        return [counts[key] for key, _, _ in hits]
+
+
+class RateLimiter:
+    def __init__(self, rules: dict, memory: MemoryStore):
+        self.rules = rules
+        self.memory = memory
+        self._lock = threading.Lock()
+        self.checks = {}
+        self.rejected = {}
+
+    @staticmethod
+    def _estimate(current: int, previous: int, elapsed: float, window: int) -> float:
+        return current + previous * (1 - elapsed / window)
+
+    def _count(self, table: dict, name: str):
+        with self._lock:
+            table[name] = table.get(name, 0) + 1
+
+    def check(self, action: str, identities: dict, store_factory=None) -> int:
+        '''Учитывает попытку; возвращает 0 или через сколько секунд повторить.
+
+        identities — {'ip': ..., 'email': ...}; store_factory вызывается, только если
+        счётчиков в памяти не хватило для отказа, и возвращает общее хранилище.
+        '''
+        now = time.time()
+        hits = []
+        for dimension, limit, window in self.rules.get(action, []):
+            value = identities.get(dimension)
+            if not value:
+                continue
+            key = f'{action}:{dimension}:{value}:{window}'
+            window_start = int(now // window * window)
+            hits.append((key, window_start, window, limit, dimension))
+        if not hits:
+            return 0
+        self._count(self.checks, action)
+
+        counts = self.memory.hit([(key, start, window) for key, start, window, _, _ in hits])
+        retry_after = self._retry_after(hits, counts, now)
+        if not retry_after and store_factory is not None:
+            store = store_factory()
+            if store is not None:
+                counts = store.hit([(key, start, window) for key, start, window, _, _ in hits])
+                retry_after = self._retry_after(hits, counts, now)
+
+        if retry_after:
+            self._count(self.rejected, action)
+        return retry_after
+
+    def _retry_after(self, hits: list, counts: list, now: float) -> int:
+        retry_after = 0
+        for (key, window_start, window, limit, dimension), (current, previous) in zip(hits, counts):
+            elapsed = now - window_start
+            if self._estimate(current, previous, elapsed, window) > limit:
+                # С запасом: к концу текущего окна вклад предыдущего окна обнуляется
+                retry_after = max(retry_after, math.ceil(window - elapsed) or 1)
+        return retry_after
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'store': RATE_LIMIT_STORE,
+                'checks': dict(self.checks),
+                'rejected': dict(self.rejected),
+                'memory_keys': self.memory.size(),
+            }
+
+
+limiter = RateLimiter(RULES, MemoryStore(MEMORY_MAX_KEYS))
+
+
+def client_ip(event: dict) -> str:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    # Левые элементы X-Forwarded-For задаёт сам клиент; достоверен только последний,
+    # который дописал прокси перед функцией
+    headers = event.get('headers') or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for') or ''
+    return forwarded.split(',')[-1].strip()
+
+
+def email_key(email: str) -> str:
+    '''В таблицу счётчиков попадает хэш адреса, а не сам адрес'''
+    return hashlib.sha256(email.encode()).hexdigest()[:32] if email else ''
+
+
+def check_rate_limit(request, action: str, email: str = '') -> int:
+    identities = {'ip': client_ip(request.event), 'email': email_key(email)}
+
+    def shared_store():
+        return PostgresStore(request.conn, request.cursor)
+
+    return limiter.check(action, identities, shared_store if RATE_LIMIT_STORE == 'postgres' else None)
+
+
+def rate_limit_stats() -> dict:
+    return limiter.stats()
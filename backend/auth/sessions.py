@@ -0,0 +1,131 @@
+'''Проверка токенов сессий с in-process LRU+TTL кэшем.
+
+Кэш живёт в тёплом инстансе функции. invalidate_session сбрасывает запись только
+в текущем инстансе, в остальных она истечёт не позже SESSION_CACHE_TTL секунд.
+Исход поиска и счётчики кэша инстанса попадают в трассу вызова (поле session_cache).
+Одинаковая копия модуля лежит в каталоге каждой функции.
+'''
+import os
+import threading
+import time
+from collections import OrderedDict
+import tracing
+from tokens import is_signed_token, verify_signed_token
+
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '10000'))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '60'))
+# Неизвестные токены кэшируются коротко, чтобы перебор не доходил до базы каждый раз
+SESSION_NEGATIVE_TTL = float(os.environ.get('SESSION_NEGATIVE_TTL', '10'))
+
+SESSION_QUERY = """
+    SELECT s.user_id, u.user_type, u.email, u.full_name, s.expires_at,
+           EXTRACT(EPOCH FROM s.expires_at - NOW()) AS ttl_seconds
+    FROM user_sessions s
+    JOIN users u ON s.user_id = u.id
+    WHERE s.session_token = %s AND s.expires_at > NOW()
+"""
+
+
+class SessionCache:
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.invalidations = 0
+
+    def get(self, token: str):
+        '''Возвращает (найдено, сессия); сессия None означает закэшированный отказ'''
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(token)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, entry[1]
+
+    def put(self, token: str, session, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, session)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            }
+
+
+_cache = SessionCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL, SESSION_NEGATIVE_TTL)
+
+
+def _annotate(result: str):
+    tracing.annotate('session_cache', {'result': result, **_cache.stats()})
+
+
+def resolve_session(cur, token: str):
+    '''Возвращает dict с user_id, user_type, email, full_name, expires_at или None'''
+    if not token:
+        return None
+    if is_signed_token(token):
+        # Подписанный токен проверяется локально, кэш для него не нужен
+        tracing.annotate('session_cache', {'result': 'signed'})
+        return verify_signed_token(cur, token)
+
+    found, session = _cache.get(token)
+    if found:
+        _annotate('hit' if session is not None else 'negative_hit')
+        return session
+    _annotate('miss')
+
+    cur.execute(SESSION_QUERY, (token,))
+    row = cur.fetchone()
+    if not row:
+        _cache.put(token, None, _cache.negative_ttl)
+        return None
+
+    session = {
+        'user_id': row['user_id'],
+        'user_type': row['user_type'],
+        'email': row['email'],
+        'full_name': row['full_name'],
+        'expires_at': row['expires_at'],
+    }
+    # Запись не переживает саму сессию, даже если TTL кэша больше
+    _cache.put(token, session, min(_cache.ttl, float(row['ttl_seconds'])))
+    return session
+
+
+def invalidate_session(token: str):
+    _cache.invalidate(token)
+
@@ -0,0 +1,190 @@
+'''Трассировка вызова функции: подключение к базе, SQL-запросы, сериализация, общее время.
+
+Одинаковая копия модуля лежит в каталоге каждой функции. Трасса вызова пишется
+в stdout одной JSON-строкой — платформа разбирает такие строки как структурированные
+логи. Пишутся выборочно (TRACE_SAMPLE_RATE), а также всегда — для холодного старта,
+ответов 5xx и вызовов с запросами медленнее TRACE_SLOW_QUERY_MS.
+'''
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.05'))
+TRACE_SLOW_QUERY_MS = float(os.environ.get('TRACE_SLOW_QUERY_MS', '200'))
+# Заголовок Server-Timing в ответе: видно во вкладке Network браузера
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', '0') == '1'
+TRACE_MAX_STATEMENTS = int(os.environ.get('TRACE_MAX_STATEMENTS', '50'))
+MAX_SQL_LENGTH = 300
+# Имя для логов вне платформы, где context.function_name нет
+FUNCTION_NAME = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+_WHITESPACE = re.compile(r'\s+')
+_local = threading.local()
+_cold = True
+_cold_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, function: str, method: str, action, request_id):
+        global _cold
+        with _cold_lock:
+            self.cold = _cold
+            _cold = False
+        self.function = function
+        self.method = method
+        self.action = action
+        self.request_id = request_id
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.started = time.perf_counter()
+        self.timings = {}
+        self.statements = []
+        self.statement_count = 0
+        self.db_ms = 0.0
+        self.slow = False
+        self.error = None
+        self.attributes = {}
+
+    def add_timing(self, name: str, ms: float):
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+
+    def add_statement(self, query, ms: float, rows: int):
+        self.statement_count += 1
+        self.db_ms += ms
+        slow = ms >= TRACE_SLOW_QUERY_MS
+        self.slow = self.slow or slow
+        if len(self.statements) < TRACE_MAX_STATEMENTS or slow:
+            if isinstance(query, bytes):
+                query = query.decode('utf-8', 'replace')
+            text = _WHITESPACE.sub(' ', str(query)).strip()[:MAX_SQL_LENGTH]
+            self.statements.append({'sql': text, 'ms': round(ms, 3), 'rows': rows, 'slow': slow})
+
+    def record_exception(self, exc: BaseException):
+        self.error = {
+            'type': type(exc).__name__,
+            'message': str(exc),
+            'traceback': traceback.format_exception(type(exc), exc, exc.__traceback__)[-5:],
+        }
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+def start(method: str, action=None, context=None) -> Trace:
+    function = getattr(context, 'function_name', None) or FUNCTION_NAME
+    trace = Trace(function, method, action, getattr(context, 'request_id', None))
+    _local.trace = trace
+    return trace
+
+
+def annotate(name: str, value):
+    '''Добавляет поле в трассу текущего вызова, если она есть'''
+    trace = current()
+    if trace is not None:
+        trace.attributes[name] = value
+
+
+@contextmanager
+def span(name: str):
+    '''Время блока суммируется в трассе текущего вызова под именем name'''
+    trace = current()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_timing(name, (time.perf_counter() - started) * 1000)
+
+
+def server_timing(trace: Trace, total_ms: float) -> str:
+    parts = [f'{name};dur={ms:.1f}' for name, ms in trace.timings.items()]
+    parts.append(f'db;dur={trace.db_ms:.1f};desc="{trace.statement_count} queries"')
+    parts.append(f'total;dur={total_ms:.1f}')
+    if trace.cold:
+        parts.append('cold')
+    return ', '.join(parts)
+
+
+def finish(trace: Trace, result: dict) -> dict:
+    '''Пишет трассу в лог, если нужно, и добавляет Server-Timing к ответу'''
+    _local.trace = None
+    total_ms = (time.perf_counter() - trace.started) * 1000
+    status = result.get('statusCode', 0)
+
+    if trace.sampled or trace.cold or trace.slow or status >= 500 or trace.error:
+        record = {
+            'level': 'ERROR' if status >= 500 else ('WARN' if trace.slow else 'INFO'),
+            'message': 'request trace',
+            'function': trace.function,
+            'request_id': trace.request_id,
+            'method': trace.method,
+            'action': trace.action,
+            'status': status,
+            'cold': trace.cold,
+            'total_ms': round(total_ms, 3),
+            'db_ms': round(trace.db_ms, 3),
+            'queries': trace.statement_count,
+            'timings_ms': {name: round(ms, 3) for name, ms in trace.timings.items()},
+            'statements': trace.statements,
+        }
+        if trace.attributes:
+            record['attributes'] = trace.attributes
+        if trace.error:
+            record['error'] = trace.error
+        sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        sys.stdout.flush()
+
+    if TRACE_SERVER_TIMING:
+        headers = dict(result.get('headers') or {})
+        headers['Server-Timing'] = server_timing(trace, total_ms)
+        headers['Timing-Allow-Origin'] = '*'
+        result = {**result, 'headers': headers}
+    return result
+
+
+_cursor_classes = {}
+
+
+def traced_cursor_class(base):
+    '''Подкласс курсора psycopg2, замеряющий execute/executemany в трассе текущего вызова'''
+    cls = _cursor_classes.get(base)
+    if cls is not None:
+        return cls
+
+    class TracedCursor(base):
+        def _record(self, trace, query, started):
+            if not isinstance(query, (str, bytes)) and hasattr(query, 'as_string'):
+                query = query.as_string(self)
+            trace.add_statement(query, (time.perf_counter() - started) * 1000, self.rowcount)
+
+        def execute(self, query, vars=None):
+            trace = current()
+            if trace is None:
+                return super().execute(query, vars)
+            started = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                self._record(trace, query, started)
+
+        def executemany(self, query, vars_list):
+            trace = current()
+            if trace is None:
+                return super().executemany(query, vars_list)
+            started = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                self._record(trace, query, started)
+
+    TracedCursor.__name__ = 'Traced' + base.__name__
+    _cursor_classes[base] = TracedCursor
+    return TracedCursor
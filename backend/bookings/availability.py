@@ -0,0 +1,94 @@
+'''Занятость вещей: календарь свободных и занятых дней и пакетная проверка свободы'''
+from datetime import date, datetime, timedelta
+
+# Бронирования в этих статусах занимают даты; пересечение запрещено ограничением bookings_no_overlap
+BLOCKING_STATUSES = ('pending', 'confirmed', 'active')
+MAX_WINDOW_DAYS = 366
+MAX_BATCH_ITEMS = 200
+
+
+class AvailabilityParamsError(ValueError):
+    pass
+
+
+def parse_date(value, name: str) -> date:
+    if not value:
+        raise AvailabilityParamsError(f'Параметр {name} обязателен')
+    if not isinstance(value, str):
+        # Из JSON-тела может прийти число, например 20300101
+        raise AvailabilityParamsError(f'Параметр {name} должен быть датой в формате ГГГГ-ММ-ДД')
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise AvailabilityParamsError(f'Параметр {name} должен быть датой в формате ГГГГ-ММ-ДД')
+
+
+def parse_window(start_value, end_value) -> tuple:
+    start = parse_date(start_value, 'start_date')
+    end = parse_date(end_value, 'end_date')
+    if end < start:
+        raise AvailabilityParamsError('Дата окончания раньше даты начала')
+    if (end - start).days + 1 > MAX_WINDOW_DAYS:
+        raise AvailabilityParamsError(f'Окно не может быть длиннее {MAX_WINDOW_DAYS} дней')
+    return start, end
+
+
+def parse_item_ids(value) -> list:
+    try:
+        ids = sorted({int(part) for part in (value or '').split(',') if part.strip()})
+    except ValueError:
+        raise AvailabilityParamsError('item_ids должен быть списком чисел через запятую')
+    if not ids:
+        raise AvailabilityParamsError('Параметр item_ids обязателен')
+    if len(ids) > MAX_BATCH_ITEMS:
+        raise AvailabilityParamsError(f'Не больше {MAX_BATCH_ITEMS} вещей за запрос')
+    return ids
+
+
+def item_calendar(cur, item_id: int, start: date, end: date) -> dict:
+    '''Занятые интервалы вещи в окне [start, end] и свободные промежутки между ними'''
+    cur.execute(
+        """SELECT start_date, end_date, status
+           FROM bookings
+           WHERE item_id = %s AND status IN %s
+             AND daterange(start_date, end_date, '[]') && daterange(%s, %s, '[]')
+           ORDER BY start_date""",
+        (item_id, BLOCKING_STATUSES, start, end)
+    )
+    busy = []
+    free = []
+    cursor = start
+    for row in cur.fetchall():
+        busy_start = max(row['start_date'], start)
+        busy_end = min(row['end_date'], end)
+        if busy_start > cursor:
+            free.append({'start_date': cursor, 'end_date': busy_start - timedelta(days=1)})
+        busy.append({'start_date': busy_start, 'end_date': busy_end, 'status': row['status']})
+        cursor = max(cursor, busy_end + timedelta(days=1))
+    if cursor <= end:
+        free.append({'start_date': cursor, 'end_date': end})
+
+    return {'item_id': item_id, 'start_date': start, 'end_date': end, 'busy': busy, 'free': free}
+
+
+def free_items(cur, item_ids: list, start: date, end: date) -> dict:
+    '''Какие из активных вещей свободны на весь интервал — один запрос по GiST-индексу ограничения'''
+    cur.execute(
+        """SELECT i.id,
+                  NOT EXISTS (
+                      SELECT 1 FROM bookings b
+                      WHERE b.item_id = i.id AND b.status IN %s
+                        AND daterange(b.start_date, b.end_date, '[]') && daterange(%s, %s, '[]')
+                  ) AS is_free
+           FROM items i
+           WHERE i.id = ANY(%s) AND i.is_active = true
+           ORDER BY i.id""",
+        (BLOCKING_STATUSES, start, end, item_ids)
+    )
+    rows = cur.fetchall()
+    return {
+        'start_date': start,
+        'end_date': end,
+        'free': [row['id'] for row in rows if row['is_free']],
+        'busy': [row['id'] for row in rows if not row['is_free']],
+    }
@@ -0,0 +1,196 @@
+'''Пул соединений с Postgres, общий для тёплых вызовов функции.
+
+Одинаковая копия модуля лежит в каталоге каждой функции: платформа
+деплоит функции независимо, поэтому общий пакет между ними недоступен.
+'''
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import connection as _BaseConnection, cursor as _BaseCursor
+import tracing
+
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', '5'))
+# Соединение, простоявшее в пуле дольше этого времени, проверяется SELECT 1 перед выдачей
+HEALTHCHECK_IDLE_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_IDLE', '30'))
+# 'session' — обычный режим; 'transaction' — совместимость с PgBouncer в режиме transaction pooling
+POOL_MODE = os.environ.get('DB_POOL_MODE', 'session')
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class TracedConnection(_BaseConnection):
+    '''Курсоры соединения пишут каждый запрос в трассу текущего вызова (см. tracing.py)'''
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or _BaseCursor
+        kwargs['cursor_factory'] = tracing.traced_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class TransactionModeConnection(TracedConnection):
+    '''Соединение для PgBouncer в режиме transaction: search_path действует только внутри транзакции,
+    поэтому он выставляется заново после каждого commit/rollback.'''
+    schema = 'public'
+
+    def begin_scope(self):
+        with self.cursor() as cur:
+            cur.execute(sql.SQL('SET LOCAL search_path TO {}').format(sql.Identifier(self.schema)))
+
+    def commit(self):
+        super().commit()
+        self.begin_scope()
+
+    def rollback(self):
+        super().rollback()
+        self.begin_scope()
+
+
+class ConnectionPool:
+    def __init__(self, dsn: str, schema: str, minconn: int = 1, maxconn: int = 5,
+                 mode: str = 'session', healthcheck_idle: float = 30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError('Некорректные размеры пула')
+        if mode not in ('session', 'transaction'):
+            raise ValueError(f'Неизвестный режим пула: {mode}')
+        self.dsn = dsn
+        self.schema = schema
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.mode = mode
+        self.healthcheck_idle = healthcheck_idle
+        self._idle = []
+        self._in_use = set()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        with tracing.span('connect'):
+            if self.mode == 'transaction':
+                # PgBouncer в режиме transaction не пропускает startup-параметр options,
+                # поэтому search_path выставляется в начале каждой транзакции
+                conn = psycopg2.connect(self.dsn, connection_factory=TransactionModeConnection)
+                conn.schema = self.schema
+                return conn
+            return psycopg2.connect(self.dsn, options=f'-c search_path={self.schema}',
+                                    connection_factory=TracedConnection)
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            _BaseConnection.rollback(conn)
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        with self._available:
+            while True:
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if len(self._in_use) < self.maxconn:
+                    conn, idle_since = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted('Нет свободных соединений с базой данных')
+                self._available.wait(remaining)
+            # Слот резервируется до подключения, чтобы не превысить maxconn
+            placeholder = object()
+            self._in_use.add(placeholder)
+
+        try:
+            if conn is None or not self._is_healthy(conn, idle_since):
+                if conn is not None:
+                    self._discard(conn)
+                conn = self._connect()
+            if self.mode == 'transaction':
+                conn.begin_scope()
+        except Exception:
+            with self._available:
+                self._in_use.discard(placeholder)
+                self._available.notify()
+            raise
+
+        with self._available:
+            self._in_use.discard(placeholder)
+            self._in_use.add(conn)
+        return conn
+
+    def putconn(self, conn):
+        broken = conn.closed
+        if not broken:
+            try:
+                # Незавершённая транзакция не должна утечь в следующий запрос;
+                # базовый rollback не открывает новую транзакцию в режиме transaction
+                _BaseConnection.rollback(conn)
+            except psycopg2.Error:
+                broken = True
+        with self._available:
+            self._in_use.discard(conn)
+            if broken or len(self._idle) >= self.maxconn:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+
+    def closeall(self):
+        with self._available:
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'idle': len(self._idle), 'in_use': len(self._in_use), 'max': self.maxconn, 'mode': self.mode}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not os.environ.get('DATABASE_URL'):
+                    raise RuntimeError('Database connection not configured')
+                _pool = ConnectionPool(
+                    os.environ['DATABASE_URL'],
+                    os.environ.get('MAIN_DB_SCHEMA', 'public'),
+                    minconn=POOL_MIN,
+                    maxconn=POOL_MAX,
+                    mode=POOL_MODE,
+                    healthcheck_idle=HEALTHCHECK_IDLE_SECONDS,
+                )
+    return _pool
+
+
+def get_db_connection():
+    # Включает ожидание свободного слота, проверку здоровья и новое подключение (отдельно — connect)
+    with tracing.span('pool'):
+        return get_pool().getconn()
+
+
+def release_db_connection(conn):
+    get_pool().putconn(conn)
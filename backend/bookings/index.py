@@ -1,142 +1,197 @@
 '''API для управления бронированиями'''
-import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
-
-def get_db_connection():
-    dsn = os.environ['DATABASE_URL']
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    conn = psycopg2.connect(dsn, options=f'-c search_path={schema}')
-    return conn
+from api import Router, HttpError, response
+from sessions import resolve_session
+from availability import (
+    AvailabilityParamsError, BLOCKING_STATUSES, parse_date, parse_window, parse_item_ids, item_calendar, free_items
+)
+from listing import ListingParamsError, build_bookings_query, paginate
+from transitions import TransitionError, transition_booking
+from maintenance import maintenance_authorized, sweep_bookings, reconcile_ratings
+from reviews import ReviewError, create_review, list_item_reviews
+from pricing import PricingError, quote_cache, fetch_priced_item, fetch_item_pricing, parse_ranges
+from export import export_authorized, export_table, export_response
+from matcher import enqueue_matches, process_match_queue, drain_outbox
 
-def handler(event: dict, context) -> dict:
-    method = event.get('httpMethod', 'GET')
+EXPORT_COLUMNS = ['id', 'updated_at', 'item_id', 'user_id', 'start_date', 'end_date', 'total_days', 'total_price',
+                  'deposit', 'status', 'version', 'created_at']
+
+router = Router(
+    'GET, POST, PUT, OPTIONS',
+    client_errors=(AvailabilityParamsError, ListingParamsError, PricingError),
+    authenticate=lambda request: resolve_session(request.cursor, request.token),
+)
+
+
+@router.route('POST', auth=True)
+def create_booking(request):
+    body = request.body
+    user_id = request.session['user_id']
+    start, end = parse_window(body.get('start_date'), body.get('end_date'))
+    try:
+        item_id = int(body.get('item_id'))
+    except (TypeError, ValueError):
+        raise HttpError(400, 'Параметр item_id обязателен')
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    # Цена, настройки тарифа и занятость на эти даты — одним запросом
+    cur = request.cursor
+    item = fetch_priced_item(cur, item_id, start, end, BLOCKING_STATUSES)
+    if not item or not item['is_active']:
+        raise HttpError(404, 'Вещь не найдена')
+    if item['is_busy']:
+        raise HttpError(409, 'Вещь уже забронирована на эти даты')
+    quote = quote_cache.model(item).quote(start, end)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    from psycopg2 import errors
+    try:
+        # Бронирование, созданное параллельно после проверки, отсекает ограничение bookings_no_overlap
+        cur.execute(
+            """INSERT INTO bookings (item_id, user_id, start_date, end_date, total_days, total_price, deposit, status)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending') RETURNING id""",
+            (item_id, user_id, start, end, quote['total_days'], quote['total_price'], quote['deposit'])
+        )
+    except errors.ExclusionViolation:
+        request.conn.rollback()
+        raise HttpError(409, 'Вещь уже забронирована на эти даты')
+    booking_id = cur.fetchone()['id']
+    request.conn.commit()
     
+    return response(200, {'booking_id': booking_id, 'total_price': quote['total_price'],
+                          'deposit': quote['deposit'], 'quote': quote})
+
+
+@router.route('GET', 'quote')
+def get_quote(request):
+    params = request.params
+    if not params.get('item_id', '').isdigit():
+        raise AvailabilityParamsError('Параметр item_id обязателен')
+    if params.get('ranges'):
+        ranges = parse_ranges(params['ranges'], parse_date)
+    else:
+        ranges = [parse_window(params.get('start_date'), params.get('end_date'))]
+    
+    item = fetch_item_pricing(request.cursor, int(params['item_id']))
+    if not item:
+        raise HttpError(404, 'Вещь не найдена')
+    model = quote_cache.model(item)
+    return response(200, {'item_id': item['id'], 'price_version': item['price_version'],
+                          'quotes': model.quote_many(ranges)})
+
+
+@router.route('GET', 'availability')
+def get_availability(request):
+    params = request.params
+    start, end = parse_window(params.get('start_date'), params.get('end_date'))
+    if not params.get('item_id', '').isdigit():
+        raise AvailabilityParamsError('Параметр item_id обязателен')
+    return response(200, item_calendar(request.cursor, int(params['item_id']), start, end))
+
+
+@router.route('GET', 'free_items')
+def get_free_items(request):
+    params = request.params
+    start, end = parse_window(params.get('start_date'), params.get('end_date'))
+    return response(200, free_items(request.cursor, parse_item_ids(params.get('item_ids')), start, end))
+
+
+@router.route('GET', 'export')
+def export_bookings(request):
+    if not export_authorized(request.event):
+        raise HttpError(403, 'Forbidden')
+    return export_response(export_table(request.conn, 'bookings', EXPORT_COLUMNS, request.params))
+
+
+@router.route('GET', auth=True)
+def list_bookings(request):
+    params = request.params
+    # Без limit/cursor сохраняется прежний ответ списком для старых клиентов; профиль листает страницами
+    paginated = 'limit' in params or 'cursor' in params
+    query, args, limit = build_bookings_query(params, request.session['user_id'], paginated)
+    
+    cur = request.cursor
+    cur.execute(query, args)
+    rows = cur.fetchall()
+    return response(200, paginate(rows, limit) if paginated else rows)
+
+
+@router.route('PUT', auth=True)
+def update_booking_status(request):
+    body = request.body
+    if not body.get('booking_id') or not body.get('status'):
+        raise HttpError(400, 'Параметры booking_id и status обязательны')
     try:
-        if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            token = event['headers'].get('X-Authorization', '').replace('Bearer ', '')
-            
-            if not token:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Требуется авторизация'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute(
-                "SELECT user_id FROM user_sessions WHERE session_token = %s AND expires_at > NOW()",
-                (token,)
-            )
-            session = cur.fetchone()
-            
-            if not session:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Сессия истекла'}),
-                    'isBase64Encoded': False
-                }
-            
-            user_id = session['user_id']
-            item_id = body['item_id']
-            start_date = body['start_date']
-            end_date = body['end_date']
-            
-            start = datetime.strptime(start_date, '%Y-%m-%d')
-            end = datetime.strptime(end_date, '%Y-%m-%d')
-            total_days = (end - start).days + 1
-            
-            cur.execute("SELECT price FROM items WHERE id = %s", (item_id,))
-            item = cur.fetchone()
-            total_price = item['price'] * total_days
-            
-            cur.execute(
-                """INSERT INTO bookings (item_id, user_id, start_date, end_date, total_days, total_price, status)
-                   VALUES (%s, %s, %s, %s, %s, %s, 'pending') RETURNING id""",
-                (item_id, user_id, start_date, end_date, total_days, total_price)
-            )
-            booking_id = cur.fetchone()['id']
-            conn.commit()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'booking_id': booking_id, 'total_price': total_price}),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'GET':
-            token = event['headers'].get('X-Authorization', '').replace('Bearer ', '')
-            
-            if not token:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Требуется авторизация'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute(
-                "SELECT user_id FROM user_sessions WHERE session_token = %s AND expires_at > NOW()",
-                (token,)
-            )
-            session = cur.fetchone()
-            
-            if not session:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Сессия истекла'}),
-                    'isBase64Encoded': False
-                }
-            
-            user_id = session['user_id']
-            
-            cur.execute(
-                """SELECT b.*, i.title, i.image_url, i.location, u.full_name as owner_name
-                   FROM bookings b
-                   JOIN items i ON b.item_id = i.id
-                   JOIN users u ON i.user_id = u.id
-                   WHERE b.user_id = %s
-                   ORDER BY b.created_at DESC""",
-                (user_id,)
-            )
-            bookings = cur.fetchall()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(b) for b in bookings], default=str),
-                'isBase64Encoded': False
-            }
+        booking_id = int(body['booking_id'])
+    except (TypeError, ValueError):
+        raise HttpError(400, 'booking_id должен быть числом')
     
-    except Exception as e:
-        conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+    try:
+        booking = transition_booking(request.cursor, booking_id, body['status'],
+                                     request.session['user_id'], body.get('version'))
+    except TransitionError as e:
+        payload = {'error': e.message}
+        if e.booking:
+            payload['booking'] = e.booking
+        return response(e.status, payload)
+    if booking['status'] == 'cancelled':
+        # Освободившиеся даты сверяются с сохранёнными поисками
+        enqueue_matches(request.cursor, [booking['item_id']], 'freed')
+    request.conn.commit()
+    
+    return response(200, booking)
+
+
+@router.route('POST', 'sweep')
+def sweep(request):
+    if not maintenance_authorized(request.event):
+        raise HttpError(403, 'Forbidden')
+    
+    result = sweep_bookings(request.conn, request.cursor)
+    return response(200, {'success': True, **result})
+
+
+@router.route('POST', 'review', auth=True)
+def post_review(request):
+    try:
+        review = create_review(request.cursor, request.session['user_id'], request.body)
+    except ReviewError as e:
+        raise HttpError(e.status, e.message)
+    request.conn.commit()
+    
+    return response(200, review)
+
+
+@router.route('GET', 'reviews')
+def get_reviews(request):
+    try:
+        return response(200, list_item_reviews(request.cursor, request.params))
+    except ReviewError as e:
+        raise HttpError(e.status, e.message)
+
+
+@router.route('POST', 'reconcile_ratings')
+def post_reconcile_ratings(request):
+    if not maintenance_authorized(request.event):
+        raise HttpError(403, 'Forbidden')
+    
+    start_after = request.body.get('next_after') if isinstance(request.body, dict) else None
+    # next_after из прошлого ответа: {"items": id, "users": id}
+    if start_after is not None and (
+        not isinstance(start_after, dict)
+        or not all(v is None or (isinstance(v, int) and not isinstance(v, bool)) for v in start_after.values())
+    ):
+        raise HttpError(400, 'next_after должен быть объектом с числовыми id')
+    result = reconcile_ratings(request.conn, request.cursor, start_after=start_after)
+    return response(200, {'success': True, **result})
+
+
+@router.route('POST', 'match')
+def post_match(request):
+    if not maintenance_authorized(request.event):
+        raise HttpError(403, 'Forbidden')
+    
+    matched = process_match_queue(request.conn, request.cursor)
+    delivered = drain_outbox(request.conn, request.cursor)
+    return response(200, {'success': True, **matched, **delivered})
+
+
+def handler(event: dict, context) -> dict:
+    return router.dispatch(event, context)
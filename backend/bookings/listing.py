@@ -0,0 +1,110 @@
+'''Список бронирований арендатора или владельца: keyset-пагинация и фильтры'''
+import base64
+import json
+from datetime import datetime
+from availability import parse_date
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+STATUSES = ('pending', 'confirmed', 'active', 'completed', 'cancelled')
+
+BOOKING_COLUMNS = (
+    'b.id, b.item_id, b.user_id, b.start_date, b.end_date, b.total_days, b.total_price, b.deposit, b.status, '
+    'b.version, b.created_at, b.updated_at, i.title, i.image_url, i.location'
+)
+
+
+class ListingParamsError(ValueError):
+    pass
+
+
+def encode_cursor(created_at, booking_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), booking_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, booking_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(booking_id)
+    except (ValueError, TypeError):
+        raise ListingParamsError('Некорректный курсор')
+
+
+def parse_limit(params: dict) -> int:
+    value = params.get('limit')
+    if value in (None, ''):
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ListingParamsError('Параметр limit должен быть числом')
+    if limit < 1:
+        raise ListingParamsError('Параметр limit должен быть положительным')
+    return min(limit, MAX_LIMIT)
+
+
+def parse_statuses(value) -> list:
+    statuses = [part.strip() for part in (value or '').split(',') if part.strip()]
+    unknown = [status for status in statuses if status not in STATUSES]
+    if unknown:
+        raise ListingParamsError(f'Неизвестные статусы: {", ".join(unknown)}')
+    return statuses
+
+
+def build_bookings_query(params: dict, user_id: int, paginated: bool) -> tuple:
+    '''role=owner — бронирования всех вещей владельца одним запросом, иначе — бронирования арендатора.
+
+    Окно start_date/end_date отбирает бронирования, пересекающиеся с ним.
+    '''
+    role = params.get('role') or 'renter'
+    if role == 'owner':
+        query = (f'SELECT {BOOKING_COLUMNS}, u.full_name as renter_name FROM bookings b '
+                 'JOIN items i ON b.item_id = i.id JOIN users u ON b.user_id = u.id')
+        conditions = ['i.user_id = %s']
+    elif role == 'renter':
+        query = (f'SELECT {BOOKING_COLUMNS}, u.full_name as owner_name FROM bookings b '
+                 'JOIN items i ON b.item_id = i.id JOIN users u ON i.user_id = u.id')
+        conditions = ['b.user_id = %s']
+    else:
+        raise ListingParamsError('Параметр role должен быть renter или owner')
+    args = [user_id]
+
+    statuses = parse_statuses(params.get('status'))
+    if statuses:
+        conditions.append('b.status = ANY(%s)')
+        args.append(statuses)
+
+    try:
+        if params.get('start_date'):
+            conditions.append('b.end_date >= %s')
+            args.append(parse_date(params['start_date'], 'start_date'))
+        if params.get('end_date'):
+            conditions.append('b.start_date <= %s')
+            args.append(parse_date(params['end_date'], 'end_date'))
+    except ValueError as e:
+        raise ListingParamsError(str(e))
+
+    if params.get('cursor'):
+        created_at, booking_id = decode_cursor(params['cursor'])
+        conditions.append('(b.created_at, b.id) < (%s, %s)')
+        args.extend([created_at, booking_id])
+
+    query += ' WHERE ' + ' AND '.join(conditions) + ' ORDER BY b.created_at DESC, b.id DESC'
+
+    limit = None
+    if paginated:
+        limit = parse_limit(params)
+        query += ' LIMIT %s'
+        args.append(limit + 1)
+    return query, args, limit
+
+
+def paginate(rows: list, limit: int) -> dict:
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and page:
+        last = page[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    return {'items': [dict(row) for row in page], 'next_cursor': next_cursor}
@@ -0,0 +1,120 @@
+'''Служебные задачи функции bookings, запускаемые по расписанию.
+
+Каждый шаг sweep_bookings обрабатывает бронирования порциями через FOR UPDATE SKIP LOCKED
+и коммитит порцию отдельно, поэтому несколько параллельных запусков делят работу, не блокируя
+друг друга и не обрабатывая одну строку дважды. Вещи снятых броней попадают в
+match_queue той же транзакцией. reconcile_ratings пересобирает рейтинги
+из reviews порциями по id.
+'''
+import hmac
+import os
+from matcher import enqueue_matches
+
+SWEEP_BATCH_SIZE = int(os.environ.get('BOOKING_SWEEP_BATCH_SIZE', '500'))
+# Неподтверждённое бронирование держит даты не дольше этого времени
+HOLD_HOURS = int(os.environ.get('BOOKING_HOLD_HOURS', '24'))
+
+# шаг -> (из статуса, в статус, условие отбора)
+SWEEP_STEPS = (
+    ('expired', 'pending', 'cancelled',
+     "(created_at < NOW() - make_interval(hours => %(hold_hours)s) OR start_date < CURRENT_DATE)"),
+    ('activated', 'confirmed', 'active', 'start_date <= CURRENT_DATE'),
+    ('completed', 'active', 'completed', 'end_date < CURRENT_DATE'),
+)
+
+RECONCILE_CHUNK_SIZE = int(os.environ.get('RATING_RECONCILE_CHUNK_SIZE', '500'))
+# таблица -> колонка reviews, по которой считается агрегат
+RATING_TARGETS = (('items', 'item_id'), ('users', 'owner_id'))
+
+
+def maintenance_authorized(event: dict) -> bool:
+    '''Служебные действия доступны только с заголовком X-Maintenance-Key, равным MAINTENANCE_KEY'''
+    expected = os.environ.get('MAINTENANCE_KEY')
+    provided = (event.get('headers') or {}).get('X-Maintenance-Key', '')
+    return bool(expected) and hmac.compare_digest(expected, provided)
+
+
+def sweep_bookings(conn, cur, batch_size: int = SWEEP_BATCH_SIZE, max_batches: int = 100) -> dict:
+    '''Снимает просроченные неподтверждённые брони, активирует начавшиеся и завершает прошедшие'''
+    result = {}
+    for name, from_status, to_status, condition in SWEEP_STEPS:
+        processed = 0
+        for _ in range(max_batches):
+            cur.execute(
+                f"""UPDATE bookings SET status = %(to_status)s, version = version + 1, updated_at = NOW()
+                    WHERE id IN (
+                        SELECT id FROM bookings WHERE status = %(from_status)s AND {condition}
+                        ORDER BY id LIMIT %(batch_size)s FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING item_id""",
+                {'from_status': from_status, 'to_status': to_status, 'batch_size': batch_size,
+                 'hold_hours': HOLD_HOURS}
+            )
+            item_ids = [row['item_id'] for row in cur.fetchall()]
+            updated = len(item_ids)
+            if to_status == 'cancelled':
+                enqueue_matches(cur, sorted(set(item_ids)), 'freed')
+            conn.commit()
+            processed += updated
+            if updated < batch_size:
+                break
+        result[name] = processed
+    return result
+
+
+def _reconcile_chunk(conn, cur, table: str, column: str, after_id: int, chunk_size: int) -> tuple:
+    '''(последний id порции или None, число исправленных строк)'''
+    cur.execute(
+        f"SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s FOR NO KEY UPDATE",
+        (after_id, chunk_size)
+    )
+    ids = [row['id'] for row in cur.fetchall()]
+    if not ids:
+        conn.commit()
+        return None, 0
+    # Строки заблокированы до подсчёта: отзыв, записанный параллельно, либо уже виден
+    # в агрегате, либо прибавит свою оценку после коммита этой порции. NO KEY UPDATE
+    # конфликтует с UPDATE рейтинга, но не с FOR KEY SHARE проверок внешних ключей —
+    # вставки броней, отзывов и изображений этих строк не ждут
+    cur.execute(
+        f"""UPDATE {table} t SET rating_sum = agg.rating_sum, reviews_count = agg.reviews_count, rating = agg.rating
+            FROM (
+                SELECT t2.id, COALESCE(sum(r.rating), 0) as rating_sum, count(r.id) as reviews_count,
+                       COALESCE(round(avg(r.rating), 2), 0) as rating
+                FROM {table} t2 LEFT JOIN reviews r ON r.{column} = t2.id
+                WHERE t2.id BETWEEN %s AND %s
+                GROUP BY t2.id
+            ) agg
+            WHERE t.id = agg.id
+              AND (t.rating_sum, t.reviews_count, t.rating) IS DISTINCT FROM (agg.rating_sum, agg.reviews_count, agg.rating)""",
+        (ids[0], ids[-1])
+    )
+    fixed = cur.rowcount
+    conn.commit()
+    return ids[-1], fixed
+
+
+def reconcile_ratings(conn, cur, chunk_size: int = RECONCILE_CHUNK_SIZE, max_chunks: int = 200,
+                      start_after: dict = None) -> dict:
+    '''Пересобирает rating_sum/reviews_count/rating из reviews, коммитя каждую порцию.
+
+    Если max_chunks не хватило, next_after содержит id, с которых продолжить следующий запуск.
+    '''
+    start_after = start_after or {}
+    result = {'fixed': {}, 'next_after': {}}
+    chunks = 0
+    for table, column in RATING_TARGETS:
+        after_id = int(start_after.get(table) or 0)
+        fixed = 0
+        while True:
+            if chunks >= max_chunks:
+                result['next_after'][table] = after_id
+                break
+            last_id, chunk_fixed = _reconcile_chunk(conn, cur, table, column, after_id, chunk_size)
+            chunks += 1
+            if last_id is None:
+                break
+            after_id = last_id
+            fixed += chunk_fixed
+        result['fixed'][table] = fixed
+    return result
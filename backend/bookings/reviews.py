@@ -0,0 +1,122 @@
+'''Отзывы о завершённых бронированиях и денормализованный рейтинг вещей и владельцев.
+
+items и users хранят rating_sum и reviews_count; запись отзыва одним запросом вставляет
+его и прибавляет оценку к обоим счётчикам, rating = rating_sum / reviews_count
+пересчитывается там же. Каталог читает готовые значения без агрегации по reviews.
+Расхождения (ручные правки, удалённые отзывы) исправляет reconcile_ratings в maintenance.py.
+'''
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_COMMENT_LENGTH = 2000
+
+CREATE_REVIEW_SQL = """
+    WITH review AS (
+        INSERT INTO reviews (booking_id, item_id, author_id, owner_id, rating, comment)
+        SELECT b.id, b.item_id, b.user_id, i.user_id, %(rating)s, %(comment)s
+        FROM bookings b JOIN items i ON b.item_id = i.id
+        WHERE b.id = %(booking_id)s AND b.user_id = %(user_id)s AND b.status = 'completed'
+        ON CONFLICT (booking_id) DO NOTHING
+        RETURNING id, booking_id, item_id, owner_id, rating, comment, created_at
+    ), item AS (
+        UPDATE items SET rating_sum = rating_sum + review.rating,
+                         reviews_count = COALESCE(reviews_count, 0) + 1,
+                         rating = round((rating_sum + review.rating)::numeric / (COALESCE(reviews_count, 0) + 1), 2)
+        FROM review WHERE items.id = review.item_id
+    ), owner AS (
+        UPDATE users SET rating_sum = rating_sum + review.rating,
+                         reviews_count = COALESCE(reviews_count, 0) + 1,
+                         rating = round((rating_sum + review.rating)::numeric / (COALESCE(reviews_count, 0) + 1), 2)
+        FROM review WHERE users.id = review.owner_id
+    )
+    SELECT * FROM review
+"""
+
+
+class ReviewError(ValueError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_review(body: dict) -> dict:
+    try:
+        booking_id = int(body.get('booking_id'))
+        rating = int(body.get('rating'))
+    except (TypeError, ValueError):
+        raise ReviewError(400, 'Параметры booking_id и rating обязательны и должны быть числами')
+    if not 1 <= rating <= 5:
+        raise ReviewError(400, 'rating должен быть от 1 до 5')
+    comment = (body.get('comment') or '').strip()
+    if len(comment) > MAX_COMMENT_LENGTH:
+        raise ReviewError(400, f'Отзыв не длиннее {MAX_COMMENT_LENGTH} символов')
+    return {'booking_id': booking_id, 'rating': rating, 'comment': comment or None}
+
+
+def create_review(cur, user_id: int, body: dict) -> dict:
+    '''Вставляет отзыв и обновляет агрегаты вещи и владельца в той же транзакции'''
+    review = parse_review(body)
+    cur.execute(CREATE_REVIEW_SQL, {**review, 'user_id': user_id})
+    created = cur.fetchone()
+    if created:
+        return dict(created)
+
+    # Строка не вставлена — выясняем причину отдельным запросом, это редкий путь
+    cur.execute(
+        """SELECT b.status, r.id as review_id FROM bookings b
+           LEFT JOIN reviews r ON r.booking_id = b.id
+           WHERE b.id = %s AND b.user_id = %s""",
+        (review['booking_id'], user_id)
+    )
+    booking = cur.fetchone()
+    if not booking:
+        raise ReviewError(404, 'Бронирование не найдено')
+    if booking['review_id']:
+        raise ReviewError(409, 'Отзыв на это бронирование уже оставлен')
+    raise ReviewError(409, 'Отзыв можно оставить только после завершения аренды')
+
+
+def encode_cursor(created_at, review_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), review_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, review_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(review_id)
+    except (ValueError, TypeError):
+        raise ReviewError(400, 'Некорректный курсор')
+
+
+def list_item_reviews(cur, params: dict) -> dict:
+    if not params.get('item_id', '').isdigit():
+        raise ReviewError(400, 'Параметр item_id обязателен')
+    try:
+        limit = min(max(int(params.get('limit') or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    except ValueError:
+        raise ReviewError(400, 'Параметр limit должен быть числом')
+
+    query = """SELECT r.id, r.rating, r.comment, r.created_at, u.full_name as author_name
+               FROM reviews r JOIN users u ON r.author_id = u.id
+               WHERE r.item_id = %s"""
+    args = [int(params['item_id'])]
+    if params.get('cursor'):
+        created_at, review_id = decode_cursor(params['cursor'])
+        query += ' AND (r.created_at, r.id) < (%s, %s)'
+        args.extend([created_at, review_id])
+    query += ' ORDER BY r.created_at DESC, r.id DESC LIMIT %s'
+    args.append(limit + 1)
+
+    cur.execute(query, args)
+    rows = cur.fetchall()
+    page = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and page:
+        next_cursor = encode_cursor(page[-1]['created_at'], page[-1]['id'])
+    return {'items': page, 'next_cursor': next_cursor}
@@ -0,0 +1,76 @@
+'''Жизненный цикл бронирования: допустимые переходы статусов и кто может их выполнять.
+
+Каждое изменение статуса увеличивает bookings.version. Клиент передаёт версию,
+которую видел, и UPDATE проходит только при совпадении — параллельное изменение
+(другой участник или служебная задача) даёт 409 вместо тихой перезаписи.
+'''
+
+# (из статуса, в статус) -> кто может выполнить переход вручную
+TRANSITIONS = {
+    ('pending', 'confirmed'): {'owner'},
+    ('pending', 'cancelled'): {'owner', 'renter'},
+    ('confirmed', 'cancelled'): {'owner', 'renter'},
+    ('confirmed', 'active'): {'owner'},
+    ('active', 'completed'): {'owner'},
+}
+
+
+class TransitionError(Exception):
+    def __init__(self, status: int, message: str, booking: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.booking = booking
+
+
+def _parse_version(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise TransitionError(400, 'version должен быть числом')
+
+
+def transition_booking(cur, booking_id, new_status: str, user_id: int, expected_version=None) -> dict:
+    '''Переводит бронирование в new_status; возвращает id, item_id, status, version, updated_at'''
+    expected_version = _parse_version(expected_version)
+    cur.execute(
+        """SELECT b.id, b.status, b.version, b.user_id, i.user_id as owner_id
+           FROM bookings b JOIN items i ON b.item_id = i.id
+           WHERE b.id = %s""",
+        (booking_id,)
+    )
+    booking = cur.fetchone()
+    if not booking:
+        raise TransitionError(404, 'Бронирование не найдено')
+
+    roles = set()
+    if booking['user_id'] == user_id:
+        roles.add('renter')
+    if booking['owner_id'] == user_id:
+        roles.add('owner')
+    if not roles:
+        raise TransitionError(404, 'Бронирование не найдено')
+
+    current = {'id': booking['id'], 'status': booking['status'], 'version': booking['version']}
+    if expected_version is not None and expected_version != booking['version']:
+        raise TransitionError(409, 'Бронирование уже изменено', current)
+
+    allowed = TRANSITIONS.get((booking['status'], new_status))
+    if allowed is None:
+        raise TransitionError(409, f'Переход {booking["status"]} -> {new_status} недопустим', current)
+    if not roles & allowed:
+        raise TransitionError(403, 'Недостаточно прав для этого перехода')
+
+    cur.execute(
+        """UPDATE bookings SET status = %s, version = version + 1, updated_at = NOW()
+           WHERE id = %s AND version = %s
+           RETURNING id, item_id, status, version, updated_at""",
+        (new_status, booking['id'], booking['version'])
+    )
+    updated = cur.fetchone()
+    if not updated:
+        # Между чтением и записью бронирование изменил другой запрос
+        raise TransitionError(409, 'Бронирование уже изменено', current)
+    return dict(updated)
@@ -0,0 +1,205 @@
+'''Массовая загрузка объявлений владельцем: JSON-массив, NDJSON или CSV.
+
+Строки проверяются по одной по мере чтения, валидные вставляются порциями через
+execute_values, каждая порция — отдельная транзакция. С ключом идемпотентности
+строка получает import_key "<ключ>:<номер строки>", и повтор того же запроса
+не создаёт дублей: уже вставленные строки пропускаются по уникальному индексу.
+'''
+import base64
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from psycopg2.extras import execute_values
+from geo import parse_coordinates
+from listing import ListingParamsError
+from matcher import enqueue_matches
+
+CHUNK_SIZE = 500
+MAX_ROWS = 10000
+MAX_REPORTED_ERRORS = 1000
+MAX_IDEMPOTENCY_KEY = 128
+# В CSV массивы features и rules записываются через этот разделитель
+CSV_LIST_SEPARATOR = '|'
+PERIODS = ('час', 'день', 'неделя', 'месяц')
+MAX_PRICE = 2147483647
+
+INSERT_SQL = """
+    INSERT INTO items (user_id, title, description, category_id, price, period, location, condition,
+                       image_url, features, rules, latitude, longitude, import_key)
+    VALUES %s
+    ON CONFLICT (user_id, import_key) WHERE import_key IS NOT NULL DO NOTHING
+    RETURNING id
+"""
+
+
+class BulkImportError(ValueError):
+    pass
+
+
+def request_text(event: dict) -> str:
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    return body
+
+
+def _content_type(event: dict) -> str:
+    headers = event.get('headers') or {}
+    return (headers.get('Content-Type') or headers.get('content-type') or '').split(';')[0].strip().lower()
+
+
+def iter_rows(event: dict):
+    '''Отдаёт (номер строки, dict или исключение разбора) не материализуя весь ввод сразу'''
+    text = request_text(event)
+    content_type = _content_type(event)
+
+    if content_type == 'text/csv':
+        reader = csv.DictReader(io.StringIO(text))
+        for number, row in enumerate(reader, start=1):
+            for name in ('features', 'rules'):
+                if row.get(name):
+                    row[name] = [part.strip() for part in row[name].split(CSV_LIST_SEPARATOR) if part.strip()]
+            yield number, row
+    elif content_type in ('application/x-ndjson', 'application/ndjson'):
+        number = 0
+        for line in io.StringIO(text):
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, BulkImportError(f'Некорректный JSON: {e}')
+    else:
+        try:
+            payload = json.loads(text or '[]')
+        except ValueError:
+            raise BulkImportError('Тело запроса должно быть JSON-массивом')
+        rows = payload.get('items') if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            raise BulkImportError('Тело запроса должно быть JSON-массивом')
+        for number, row in enumerate(rows, start=1):
+            yield number, row
+
+
+def _optional_text(row: dict, name: str, max_length, default: str = '') -> str:
+    '''Строка не длиннее max_length (None — без ограничения), как колонка в items'''
+    value = row.get(name)
+    if value in (None, ''):
+        return default
+    if not isinstance(value, str):
+        raise BulkImportError(f'{name} должен быть строкой')
+    value = value.strip()
+    if max_length is not None and len(value) > max_length:
+        raise BulkImportError(f'{name} не длиннее {max_length} символов')
+    return value or default
+
+
+def _price(row: dict) -> int:
+    value = row.get('price')
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise BulkImportError('price должен быть целым числом')
+    try:
+        price = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise BulkImportError('price должен быть целым числом')
+    # Дробная цена отклоняется, а не обрезается
+    if not price.is_finite() or price != price.to_integral_value():
+        raise BulkImportError('price должен быть целым числом')
+    if price < 0 or price > MAX_PRICE:
+        raise BulkImportError(f'price должен быть от 0 до {MAX_PRICE}')
+    return int(price)
+
+
+def _text_list(row: dict, name: str) -> list:
+    value = row.get(name) or []
+    if not isinstance(value, list):
+        raise BulkImportError(f'{name} должен быть списком')
+    if any(isinstance(v, (dict, list, bool)) or v is None for v in value):
+        raise BulkImportError(f'Элементы {name} должны быть строками')
+    return [str(v) for v in value]
+
+
+def validate_row(row, user_id: int, categories: set, import_key) -> tuple:
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise BulkImportError('Строка должна быть объектом')
+
+    title = _optional_text(row, 'title', 255)
+    if not title:
+        raise BulkImportError('title обязателен и не длиннее 255 символов')
+    category_id = row.get('category_id')
+    if not isinstance(category_id, str) or category_id not in categories:
+        raise BulkImportError(f'Неизвестная категория: {category_id}')
+    price = _price(row)
+    period = _optional_text(row, 'period', 20, 'день')
+    if period not in PERIODS:
+        raise BulkImportError(f'period должен быть одним из: {", ".join(PERIODS)}')
+
+    try:
+        latitude, longitude = parse_coordinates(row)
+    except ListingParamsError as e:
+        raise BulkImportError(str(e))
+
+    return (
+        user_id,
+        title,
+        _optional_text(row, 'description', None),
+        category_id,
+        price,
+        period,
+        _optional_text(row, 'location', 255),
+        _optional_text(row, 'condition', 50, 'Хорошее'),
+        _optional_text(row, 'image_url', None),
+        _text_list(row, 'features'),
+        _text_list(row, 'rules'),
+        latitude,
+        longitude,
+        import_key,
+    )
+
+
+def _flush(conn, cur, chunk: list) -> int:
+    inserted = execute_values(cur, INSERT_SQL, chunk, page_size=len(chunk), fetch=True)
+    enqueue_matches(cur, [row['id'] for row in inserted], 'new_item')
+    conn.commit()
+    return len(inserted)
+
+
+def import_items(conn, cur, event: dict, user_id: int, idempotency_key) -> dict:
+    if idempotency_key and len(idempotency_key) > MAX_IDEMPOTENCY_KEY:
+        raise BulkImportError(f'Ключ идемпотентности не длиннее {MAX_IDEMPOTENCY_KEY} символов')
+
+    cur.execute("SELECT id FROM categories")
+    categories = {row['id'] for row in cur.fetchall()}
+
+    report = {'received': 0, 'created': 0, 'duplicates': 0, 'failed': 0, 'errors': []}
+    chunk = []
+    for number, row in iter_rows(event):
+        if number > MAX_ROWS:
+            report['errors'].append({'row': number, 'error': f'Превышен лимит {MAX_ROWS} строк, остаток не обработан'})
+            break
+        report['received'] += 1
+        import_key = f'{idempotency_key}:{number}' if idempotency_key else None
+        try:
+            chunk.append(validate_row(row, user_id, categories, import_key))
+        except BulkImportError as e:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': number, 'error': str(e)})
+            continue
+
+        if len(chunk) >= CHUNK_SIZE:
+            created = _flush(conn, cur, chunk)
+            report['created'] += created
+            report['duplicates'] += len(chunk) - created
+            chunk = []
+
+    if chunk:
+        created = _flush(conn, cur, chunk)
+        report['created'] += created
+        report['duplicates'] += len(chunk) - created
+
+    return report
@@ -0,0 +1,113 @@
+'''Кэш готовых ответов публичного каталога с ETag.
+
+Ответы GET кэшируются в тёплом инстансе по нормализованным параметрам запроса уже
+сериализованными. POST объявления сбрасывает кэш текущего инстанса, в остальных
+записи живут не дольше LISTING_CACHE_TTL секунд.
+'''
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from api import response
+
+LISTING_CACHE_TTL = int(os.environ.get('LISTING_CACHE_TTL', '30'))
+LISTING_CACHE_SIZE = int(os.environ.get('LISTING_CACHE_SIZE', '256'))
+# Очень большие ответы (выгрузка всего каталога) не кэшируются, чтобы не раздувать память инстанса
+LISTING_CACHE_MAX_BODY = int(os.environ.get('LISTING_CACHE_MAX_BODY', str(1024 * 1024)))
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'expires'])
+
+
+def cache_key(params: dict) -> tuple:
+    '''Порядок параметров и пустые значения не влияют на ключ'''
+    return tuple(sorted((name, value.strip()) for name, value in params.items() if value and value.strip()))
+
+
+def make_etag(body: str) -> str:
+    return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+
+def etag_matches(event: dict, etag: str) -> bool:
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match') or ''
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in candidates or '*' in candidates
+
+
+class ListingCache:
+    def __init__(self, ttl: int, maxsize: int, max_body: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_body = max_body
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+
+    def get(self, key: tuple):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, body: str) -> CachedResponse:
+        entry = CachedResponse(body, make_etag(body), time.monotonic() + self.ttl)
+        if len(body) > self.max_body:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def record_not_modified(self, entry: CachedResponse):
+        with self._lock:
+            self.not_modified += 1
+            self.bytes_saved += len(entry.body.encode())
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'not_modified': self.not_modified,
+                'bytes_saved': self.bytes_saved,
+            }
+
+
+listing_cache = ListingCache(LISTING_CACHE_TTL, LISTING_CACHE_SIZE, LISTING_CACHE_MAX_BODY)
+
+
+def cached_response(entry: CachedResponse, event: dict) -> dict:
+    '''200 с телом из кэша или 304, если клиент прислал совпадающий If-None-Match'''
+    headers = {
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': entry.etag,
+        'Cache-Control': f'public, max-age={listing_cache.ttl}',
+    }
+    if etag_matches(event, entry.etag):
+        listing_cache.record_not_modified(entry)
+        return response(304, headers=headers)
+    return response(200, headers=headers, body=entry.body)
+
+
+def listing_cache_stats() -> dict:
+    return listing_cache.stats()
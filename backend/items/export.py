@@ -0,0 +1,156 @@
+'''Выгрузка таблицы для аналитики в NDJSON или CSV с инкрементом по updated_at.
+
+Одинаковая копия модуля лежит в каталоге каждой функции. Строки читаются серверным
+(именованным) курсором порциями по EXPORT_ITERSIZE и сразу пишутся в тело ответа.
+Функция не умеет отдавать поток, поэтому один ответ ограничен EXPORT_MAX_BYTES и
+EXPORT_MAX_ROWS, а продолжение выдаётся курсором (updated_at, id) в заголовке
+X-Export-Cursor: память не зависит от размера таблицы, клиент повторяет запрос, пока
+курсор не пуст. Параметр since начинает выгрузку с отметки updated_at (включительно) или
+с отметки "updated_at,id" из X-Export-Watermark прошлой выгрузки (строго после неё).
+'''
+import base64
+import csv
+import hmac
+import io
+import json
+import os
+import uuid
+from datetime import datetime
+from api import dumps, HttpError
+
+EXPORT_ITERSIZE = int(os.environ.get('EXPORT_ITERSIZE', '2000'))
+EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', '50000'))
+# Ниже лимита размера ответа функции с запасом на заголовки
+EXPORT_MAX_BYTES = int(os.environ.get('EXPORT_MAX_BYTES', str(3 * 1024 * 1024)))
+# Строки моложе этого не выгружаются: транзакция, начатая раньше, ещё может закоммитить
+# строку с меньшим updated_at, и следующая страница её бы пропустила
+EXPORT_SAFETY_LAG_SECONDS = int(os.environ.get('EXPORT_SAFETY_LAG_SECONDS', '60'))
+# Разделитель элементов массивов в CSV — как в массовой загрузке объявлений
+CSV_LIST_SEPARATOR = '|'
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+
+def export_authorized(event: dict) -> bool:
+    '''Выгрузка доступна с заголовком X-Export-Key, равным EXPORT_KEY (или MAINTENANCE_KEY)'''
+    expected = os.environ.get('EXPORT_KEY') or os.environ.get('MAINTENANCE_KEY')
+    headers = event.get('headers') or {}
+    provided = headers.get('X-Export-Key') or headers.get('x-export-key') or ''
+    return bool(expected) and hmac.compare_digest(expected, provided)
+
+
+def encode_cursor(updated_at, row_id: int) -> str:
+    raw = json.dumps([updated_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        updated_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HttpError(400, 'Некорректный курсор')
+
+
+def _start_position(params: dict) -> tuple:
+    if params.get('cursor'):
+        return decode_cursor(params['cursor'])
+    if params.get('since'):
+        # "updated_at,id" — отметка прошлой выгрузки: её последняя строка не повторяется
+        since, _, row_id = params['since'].partition(',')
+        try:
+            return datetime.fromisoformat(since.strip()), int(row_id) if row_id else 0
+        except ValueError:
+            raise HttpError(400, 'Параметр since должен быть датой и временем в ISO 8601 или отметкой updated_at,id')
+    return datetime.min, 0
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return CSV_LIST_SEPARATOR.join(str(v) for v in value)
+    if isinstance(value, dict):
+        return dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_table(conn, table: str, columns: list, params: dict) -> dict:
+    '''Одна страница выгрузки table; columns — имена колонок, первыми должны идти id и updated_at'''
+    export_format = params.get('format') or 'ndjson'
+    if export_format not in CONTENT_TYPES:
+        raise HttpError(400, 'Параметр format должен быть ndjson или csv')
+    try:
+        max_rows = min(int(params.get('limit') or EXPORT_MAX_ROWS), EXPORT_MAX_ROWS)
+    except ValueError:
+        raise HttpError(400, 'Параметр limit должен быть числом')
+    updated_at, row_id = _start_position(params)
+
+    output = io.StringIO()
+    row_buffer = io.StringIO()
+    writer = None
+    if export_format == 'csv':
+        writer = csv.writer(row_buffer, lineterminator='\n')
+        writer.writerow(columns)
+        output.write(row_buffer.getvalue())
+
+    # Именованный курсор живёт до конца транзакции; fetch идёт порциями по itersize
+    cur = conn.cursor(name=f'export_{uuid.uuid4().hex}')
+    cur.itersize = EXPORT_ITERSIZE
+    cur.execute(
+        f"""SELECT {', '.join(columns)} FROM {table}
+            WHERE (updated_at, id) > (%s, %s)
+              AND updated_at < NOW() - make_interval(secs => %s)
+            ORDER BY updated_at, id""",
+        (updated_at, row_id, EXPORT_SAFETY_LAG_SECONDS)
+    )
+
+    rows = 0
+    size = 0
+    last = None
+    truncated = False
+    try:
+        for row in cur:
+            if rows >= max_rows or size >= EXPORT_MAX_BYTES:
+                truncated = True
+                break
+            if writer:
+                row_buffer.seek(0)
+                row_buffer.truncate()
+                writer.writerow([_csv_value(value) for value in row])
+                line = row_buffer.getvalue()
+            else:
+                line = dumps(dict(zip(columns, row))) + '\n'
+            output.write(line)
+            size += len(line.encode())
+            rows += 1
+            last = row
+    finally:
+        cur.close()
+
+    next_cursor = None
+    if truncated and last is not None:
+        next_cursor = encode_cursor(last[1], last[0])
+    return {
+        'body': output.getvalue(),
+        'content_type': CONTENT_TYPES[export_format],
+        'rows': rows,
+        'next_cursor': next_cursor,
+        # Отметка для следующей инкрементальной выгрузки, когда страницы закончились
+        'watermark': f'{last[1].isoformat()},{last[0]}' if last is not None else None,
+    }
+
+
+def export_response(page: dict) -> dict:
+    headers = {
+        'Content-Type': page['content_type'],
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Export-Cursor, X-Export-Rows, X-Export-Watermark',
+        'X-Export-Rows': str(page['rows']),
+        'X-Export-Cursor': page['next_cursor'] or '',
+        'X-Export-Watermark': page['watermark'] or '',
+    }
+    return {'statusCode': 200, 'headers': headers, 'body': page['body'], 'isBase64Encoded': False}
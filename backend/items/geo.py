@@ -0,0 +1,163 @@
+'''Поиск объявлений рядом с точкой без PostGIS: сетка 0.1° + bounding box + точный haversine.
+
+Колонка items.geo_cell (генерируемая, см. V0008) хранит номер ячейки сетки. Запрос
+перечисляет ячейки, покрывающие bounding box радиуса, и идёт по индексу geo_cell;
+расстояние по формуле гаверсинуса считается только для кандидатов.
+'''
+import base64
+import json
+import math
+from listing import ListingParamsError, parse_limit, select_clause, where_clause
+
+EARTH_RADIUS_KM = 6371.0
+# Та же сфера, что в haversine, иначе прямоугольник выходит меньше круга
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Запас на округление: прямоугольник лишь предфильтр, точное расстояние проверяется после
+BBOX_MARGIN = 1.01
+# Должны совпадать с выражением items.geo_cell в V0008__add_items_geo.sql
+CELLS_PER_DEGREE = 10
+CELLS_PER_ROW = 360 * CELLS_PER_DEGREE
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 200.0
+# При большем числе ячеек выгоднее диапазон по индексу широты
+MAX_CELLS = 2000
+
+
+def _coordinate(values: dict, name: str):
+    value = values.get(name)
+    if value in (None, ''):
+        return None
+    if isinstance(value, bool):
+        raise ListingParamsError(f'{name} должен быть числом')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ListingParamsError(f'{name} должен быть числом')
+
+
+def parse_coordinates(values: dict) -> tuple:
+    '''(latitude, longitude) объявления или (None, None); те же правила, что у items_coordinates_range'''
+    latitude = _coordinate(values, 'latitude')
+    longitude = _coordinate(values, 'longitude')
+    if (latitude is None) != (longitude is None):
+        raise ListingParamsError('latitude и longitude задаются вместе')
+    if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ListingParamsError('Координаты вне допустимого диапазона')
+    return latitude, longitude
+
+
+def parse_near(params: dict) -> tuple:
+    try:
+        lat_text, lon_text = params['near'].split(',')
+        lat, lon = float(lat_text), float(lon_text)
+    except (ValueError, KeyError):
+        raise ListingParamsError('Параметр near должен иметь вид широта,долгота')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ListingParamsError('Координаты вне допустимого диапазона')
+
+    try:
+        radius = float(params.get('radius_km') or DEFAULT_RADIUS_KM)
+    except ValueError:
+        raise ListingParamsError('Параметр radius_km должен быть числом')
+    if not (0 < radius <= MAX_RADIUS_KM):
+        raise ListingParamsError(f'radius_km должен быть в диапазоне (0, {MAX_RADIUS_KM:g}]')
+    return lat, lon, radius
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple:
+    '''(lat_min, lat_max, [(lon_min, lon_max), ...]); долгота режется на два отрезка при переходе через 180°'''
+    radius_km = radius_km * BBOX_MARGIN
+    dlat = radius_km / KM_PER_DEGREE
+    lat_min, lat_max = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+
+    cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if cos_lat < 1e-6 or lat_min <= -90 or lat_max >= 90:
+        return lat_min, lat_max, [(-180.0, 180.0)]
+    dlon = radius_km / (KM_PER_DEGREE * cos_lat)
+    if dlon >= 180:
+        return lat_min, lat_max, [(-180.0, 180.0)]
+
+    lon_min, lon_max = lon - dlon, lon + dlon
+    if lon_min < -180:
+        return lat_min, lat_max, [(lon_min + 360, 180.0), (-180.0, lon_max)]
+    if lon_max > 180:
+        return lat_min, lat_max, [(lon_min, 180.0), (-180.0, lon_max - 360)]
+    return lat_min, lat_max, [(lon_min, lon_max)]
+
+
+def _cell_index(value: float, offset: int, count: int) -> int:
+    return min(count - 1, int(math.floor((value + offset) * CELLS_PER_DEGREE)))
+
+
+def covering_cells(lat_min: float, lat_max: float, lon_ranges: list):
+    '''Номера ячеек, покрывающих bbox, или None, если их больше MAX_CELLS'''
+    rows = range(_cell_index(lat_min, 90, 180 * CELLS_PER_DEGREE), _cell_index(lat_max, 90, 180 * CELLS_PER_DEGREE) + 1)
+    columns = []
+    for lon_min, lon_max in lon_ranges:
+        columns.extend(range(_cell_index(lon_min, 180, CELLS_PER_ROW), _cell_index(lon_max, 180, CELLS_PER_ROW) + 1))
+    if len(rows) * len(columns) > MAX_CELLS:
+        return None
+    return [row * CELLS_PER_ROW + column for row in rows for column in columns]
+
+
+def encode_cursor(distance: float, item_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([distance, item_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        distance, item_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(distance), int(item_id)
+    except (ValueError, TypeError):
+        raise ListingParamsError('Некорректный курсор')
+
+
+def build_near_query(params: dict) -> tuple:
+    lat, lon, radius = parse_near(params)
+    columns, needs_owner = select_clause(params)
+    conditions, args = where_clause(params)
+    limit = parse_limit(params)
+
+    lat_min, lat_max, lon_ranges = bounding_box(lat, lon, radius)
+    cells = covering_cells(lat_min, lat_max, lon_ranges)
+    if cells is not None:
+        conditions.append('i.geo_cell = ANY(%s)')
+        args.append(cells)
+    conditions.append('i.latitude BETWEEN %s AND %s')
+    args.extend([lat_min, lat_max])
+    if lon_ranges != [(-180.0, 180.0)]:
+        conditions.append('(' + ' OR '.join('i.longitude BETWEEN %s AND %s' for _ in lon_ranges) + ')')
+        for lon_min, lon_max in lon_ranges:
+            args.extend([lon_min, lon_max])
+
+    # least(1, ...) защищает asin от погрешности округления у антиподов
+    distance_sql = """2 * %s * asin(least(1.0, sqrt(
+        power(sin(radians(i.latitude - %s) / 2), 2)
+        + cos(radians(%s)) * cos(radians(i.latitude)) * power(sin(radians(i.longitude - %s) / 2), 2)
+    )))"""
+    query = f"""
+        SELECT * FROM (
+            SELECT {columns}, {distance_sql} AS distance_km
+            FROM items i{' JOIN users u ON i.user_id = u.id' if needs_owner else ''}
+            WHERE {' AND '.join(conditions)}
+        ) candidates
+        WHERE distance_km <= %s
+    """
+    args = [EARTH_RADIUS_KM, lat, lat, lon] + args + [radius]
+
+    if params.get('cursor'):
+        distance, item_id = decode_cursor(params['cursor'])
+        query += ' AND (distance_km, id) > (%s, %s)'
+        args.extend([distance, item_id])
+
+    query += ' ORDER BY distance_km, id LIMIT %s'
+    args.append(limit + 1)
+    return query, args, limit
+
+
+def paginate_near(rows: list, limit: int) -> dict:
+    page = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and page:
+        next_cursor = encode_cursor(page[-1]['distance_km'], page[-1]['id'])
+    return {'items': page, 'next_cursor': next_cursor}
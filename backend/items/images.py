@@ -0,0 +1,300 @@
+'''Загрузка изображений объявлений: хранение по sha256, WebP-миниатюры, дедупликация.
+
+Файл из тела запроса декодируется порциями во временный файл с одновременным подсчётом
+sha256, поэтому в памяти не держится вторая копия. Ключ хранилища — хэш содержимого:
+повторная загрузка того же файла (тем же или другим владельцем) находит запись
+в image_blobs и не пересоздаёт ни оригинал, ни миниатюры — если их объекты
+действительно есть в хранилище, иначе они создаются заново.
+
+Миниатюры фиксированных ширин рендерятся в пуле процессов — Pillow держит GIL на
+декодировании. Хранилище по умолчанию — S3-совместимый бакет (например Yandex Object
+Storage); локальный каталог (IMAGE_STORAGE=local) только для разработки: /tmp инстанса
+не общий и пропадает при его перезапуске.
+'''
+import base64
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_STORAGE = os.environ.get('IMAGE_STORAGE', 's3')
+IMAGE_STORAGE_DIR = os.environ.get('IMAGE_STORAGE_DIR', os.path.join(tempfile.gettempdir(), 'item-images'))
+# Для локального хранилища файлы отдаёт сама функция: GET ?action=image&key=...
+IMAGE_BASE_URL = os.environ.get(
+    'IMAGE_BASE_URL', 'https://functions.poehali.dev/916b95b6-3d7c-485f-996b-df65abfbe772?action=image&key='
+)
+IMAGE_S3_BUCKET = os.environ.get('IMAGE_S3_BUCKET', '')
+IMAGE_S3_ENDPOINT = os.environ.get('IMAGE_S3_ENDPOINT', 'https://storage.yandexcloud.net')
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', str(min(4, os.cpu_count() or 1))))
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', str(10 * 1024 * 1024)))
+THUMBNAIL_WIDTHS = (160, 480, 960)
+# Ширина, которая попадает в items.image_url — её показывает сетка карточек
+CARD_WIDTH = 480
+WEBP_QUALITY = 80
+# Кратно 4, чтобы каждая порция base64 декодировалась независимо
+DECODE_CHUNK = 256 * 1024
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp', 'image/gif': 'gif'}
+
+
+class ImageUploadError(ValueError):
+    pass
+
+
+class LocalStorage:
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ImageUploadError('Некорректный ключ изображения')
+        return path
+
+    def put(self, key: str, data: bytes, content_type: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл: параллельная загрузка того же хэша не увидит обрезанный файл
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def url(self, key: str) -> str:
+        return self.base_url + key
+
+
+class S3Storage:
+    def __init__(self, bucket: str, endpoint: str, base_url: str):
+        import boto3
+        self.bucket = bucket
+        self.base_url = base_url
+        self.client = boto3.client('s3', endpoint_url=endpoint)
+
+    def put(self, key: str, data: bytes, content_type: str):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type,
+                               CacheControl='public, max-age=31536000, immutable')
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def get(self, key: str):
+        return None
+
+    def url(self, key: str) -> str:
+        return self.base_url + key
+
+
+_storage = None
+_pool = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        if IMAGE_STORAGE == 's3':
+            if not IMAGE_S3_BUCKET:
+                raise RuntimeError('IMAGE_S3_BUCKET не задан (для разработки: IMAGE_STORAGE=local)')
+            base_url = os.environ.get('IMAGE_BASE_URL') or f'{IMAGE_S3_ENDPOINT}/{IMAGE_S3_BUCKET}/'
+            _storage = S3Storage(IMAGE_S3_BUCKET, IMAGE_S3_ENDPOINT, base_url)
+        else:
+            _storage = LocalStorage(IMAGE_STORAGE_DIR, IMAGE_BASE_URL)
+    return _storage
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def original_key(digest: str, content_type: str) -> str:
+    return f'originals/{digest[:2]}/{digest}.{EXTENSIONS[content_type]}'
+
+
+def variant_key(digest: str, width: int) -> str:
+    return f'variants/{digest[:2]}/{digest}-{width}.webp'
+
+
+def spool_upload(event: dict, body: dict = None) -> tuple:
+    '''Декодирует base64 порциями во временный файл; возвращает (путь, sha256, размер)'''
+    if event.get('isBase64Encoded'):
+        encoded = event.get('body') or ''
+    else:
+        encoded = (body or {}).get('data') or ''
+    if not encoded:
+        raise ImageUploadError('Пустое тело запроса')
+    if '\n' in encoded:
+        # Переводы строк сбили бы выравнивание порций по 4 символа
+        encoded = encoded.replace('\r', '').replace('\n', '')
+    if len(encoded) * 3 // 4 > MAX_IMAGE_BYTES + 3:
+        raise ImageUploadError(f'Файл больше {MAX_IMAGE_BYTES // (1024 * 1024)} МБ')
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for offset in range(0, len(encoded), DECODE_CHUNK):
+                chunk = base64.b64decode(encoded[offset:offset + DECODE_CHUNK])
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+    except (ValueError, TypeError):
+        os.unlink(path)
+        raise ImageUploadError('Тело запроса должно быть в base64')
+    return path, digest.hexdigest(), size
+
+
+def _inspect(path: str) -> tuple:
+    '''(content_type, ширина, высота) — Pillow читает только заголовок файла'''
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ImageUploadError('Файл не является изображением')
+    if image_format not in CONTENT_TYPES:
+        raise ImageUploadError('Поддерживаются JPEG, PNG, WebP и GIF')
+    return CONTENT_TYPES[image_format], width, height
+
+
+def render_variant(path: str, width: int) -> bytes:
+    '''Выполняется в процессе пула: WebP шириной не больше width с сохранением пропорций'''
+    from PIL import Image, ImageOps
+    with Image.open(path) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (width, width * image.height // max(image.width, 1)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+        return output.getvalue()
+
+
+def _render_all(path: str, widths: tuple) -> list:
+    try:
+        return list(get_pool().map(render_variant, [path] * len(widths), widths))
+    except (OSError, NotImplementedError):
+        # Без /dev/shm или fork пул не создаётся — рендерим в текущем процессе
+        return [render_variant(path, width) for width in widths]
+
+
+def _blob_keys(blob: dict) -> list:
+    keys = [original_key(blob['sha256'], blob['content_type'])]
+    keys.extend(variant_key(blob['sha256'], int(w)) for w in (blob['variants'] or {}) if w.isdigit())
+    return keys
+
+
+def store_blob(cur, path: str, digest: str, size: int) -> dict:
+    '''Сохраняет оригинал и миниатюры, если такого хэша ещё нет; возвращает строку image_blobs'''
+    cur.execute("SELECT sha256, content_type, width, height, variants FROM image_blobs WHERE sha256 = %s", (digest,))
+    existing = cur.fetchone()
+    storage = get_storage()
+    # Запись в image_blobs переживает объекты хранилища (потерянный каталог, удалённый бакет):
+    # доверяем ей, только если все файлы на месте, иначе загрузка их восстанавливает
+    if existing and all(storage.exists(key) for key in _blob_keys(existing)):
+        return dict(existing, deduplicated=True)
+
+    content_type, width, height = _inspect(path)
+    with open(path, 'rb') as f:
+        storage.put(original_key(digest, content_type), f.read(), content_type)
+
+    # Миниатюры не шире оригинала: маленькая картинка получает один вариант своей ширины
+    widths = tuple(w for w in THUMBNAIL_WIDTHS if w < width) or (width,)
+    variants = {}
+    for variant_width, data in zip(widths, _render_all(path, widths)):
+        key = variant_key(digest, variant_width)
+        storage.put(key, data, 'image/webp')
+        variants[str(variant_width)] = storage.url(key)
+    variants['original'] = storage.url(original_key(digest, content_type))
+
+    from psycopg2.extras import Json
+    # Запись с тем же хэшем (восстановление или параллельная загрузка) описывает то же содержимое
+    cur.execute(
+        """INSERT INTO image_blobs (sha256, content_type, bytes, width, height, variants)
+           VALUES (%s, %s, %s, %s, %s, %s)
+           ON CONFLICT (sha256) DO UPDATE SET content_type = EXCLUDED.content_type, bytes = EXCLUDED.bytes,
+               width = EXCLUDED.width, height = EXCLUDED.height, variants = EXCLUDED.variants
+           RETURNING sha256, content_type, width, height, variants""",
+        (digest, content_type, size, width, height, Json(variants))
+    )
+    return dict(cur.fetchone(), deduplicated=False)
+
+
+def card_url(variants: dict) -> str:
+    candidates = sorted((int(w), url) for w, url in variants.items() if w.isdigit())
+    for width, url in candidates:
+        if width >= CARD_WIDTH:
+            return url
+    return candidates[-1][1] if candidates else variants.get('original', '')
+
+
+def upload_item_image(conn, cur, event: dict, body: dict, item_id: int) -> dict:
+    path, digest, size = spool_upload(event, body)
+    try:
+        blob = store_blob(cur, path, digest, size)
+    finally:
+        os.unlink(path)
+
+    cur.execute(
+        """INSERT INTO item_images (item_id, sha256, position)
+           SELECT %s, %s, COALESCE(max(position) + 1, 0) FROM item_images WHERE item_id = %s
+           ON CONFLICT (item_id, sha256) DO NOTHING
+           RETURNING position""",
+        (item_id, digest, item_id)
+    )
+    inserted = cur.fetchone()
+    if inserted and inserted['position'] == 0:
+        # Первое изображение становится обложкой: в каталог уходит миниатюра, а не оригинал
+        from psycopg2.extras import Json
+        cur.execute(
+            "UPDATE items SET image_url = %s, image_variants = %s, updated_at = NOW() WHERE id = %s",
+            (card_url(blob['variants']), Json(blob['variants']), item_id)
+        )
+    conn.commit()
+
+    return {
+        'sha256': digest,
+        'width': blob['width'],
+        'height': blob['height'],
+        'variants': blob['variants'],
+        'deduplicated': blob['deduplicated'],
+        'position': inserted['position'] if inserted else None,
+    }
+
+
+def read_local_image(key: str):
+    '''(байты, content_type) для GET ?action=image при локальном хранилище'''
+    # Из S3 файлы отдаёт сам бакет; клиент хранилища ради 404 не создаётся
+    if IMAGE_STORAGE != 'local' or not key:
+        return None, None
+    data = get_storage().get(key)
+    extension = key.rsplit('.', 1)[-1]
+    content_type = 'image/webp' if extension == 'webp' else {v: k for k, v in EXTENSIONS.items()}.get(extension)
+    return data, content_type
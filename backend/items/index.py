@@ -1,128 +1,210 @@
 '''API для управления объявлениями'''
-import json
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import base64
+from api import Router, HttpError, response, dumps, lazy_import
+from sessions import resolve_session
+from listing import build_listing_query, paginate, ListingParamsError
+from cache import listing_cache, cache_key, cached_response, listing_cache_stats
+import matcher
+from pricing import PriceModel, PricingError
 
-def get_db_connection():
-    dsn = os.environ['DATABASE_URL']
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    conn = psycopg2.connect(dsn, options=f'-c search_path={schema}')
-    return conn
+search = lazy_import('search')
+geo = lazy_import('geo')
+bulk = lazy_import('bulk')
+images = lazy_import('images')
+export = lazy_import('export')
 
-def handler(event: dict, context) -> dict:
-    method = event.get('httpMethod', 'GET')
+EXPORT_COLUMNS = ['id', 'updated_at', 'user_id', 'title', 'description', 'category_id', 'price', 'period',
+                  'pricing', 'location', 'latitude', 'longitude', 'condition', 'image_url', 'features', 'rules',
+                  'rating', 'reviews_count', 'is_active', 'created_at']
+
+router = Router(
+    'GET, POST, PUT, DELETE, OPTIONS',
+    client_errors=(ListingParamsError, PricingError, matcher.SavedSearchError),
+    authenticate=lambda request: resolve_session(request.cursor, request.token),
+    allow_headers='Content-Type, X-Authorization, If-None-Match, Idempotency-Key',
+)
+
+
+@router.route('GET', 'cache_stats')
+def get_cache_stats(request):
+    return response(200, listing_cache_stats())
+
+
+@router.route('GET', 'export')
+def export_items(request):
+    if not export.export_authorized(request.event):
+        raise HttpError(403, 'Forbidden')
+    return export.export_response(export.export_table(request.conn, 'items', EXPORT_COLUMNS, request.params))
+
+
+@router.route('GET')
+def list_items(request):
+    params = request.params
+    # Кэшированный ответ и 304 отдаются без обращения к базе
+    key = cache_key(params)
+    cached = listing_cache.get(key)
+    if cached:
+        return cached_response(cached, request.event)
+    
+    searching = bool(params.get('q'))
+    nearby = bool(params.get('near'))
+    # Без limit/cursor сохраняется прежний ответ списком для старых клиентов; фронтенд листает страницами
+    paginated = searching or nearby or 'limit' in params or 'cursor' in params
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    if searching and nearby:
+        raise ListingParamsError('Параметры q и near нельзя использовать вместе')
+    if searching:
+        query, args, limit, offset = search.build_search_query(params)
+    elif nearby:
+        query, args, limit = geo.build_near_query(params)
+    else:
+        query, args, limit = build_listing_query(params, paginated)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = request.cursor
+    cur.execute(query, args)
+    items = cur.fetchall()
     
+    if searching:
+        payload = search.paginate_search(items, limit, offset)
+    elif nearby:
+        payload = geo.paginate_near(items, limit)
+    elif paginated:
+        payload = paginate(items, limit)
+    else:
+        payload = items
+    
+    entry = listing_cache.put(key, dumps(payload))
+    return cached_response(entry, request.event)
+
+
+@router.route('POST', auth=True)
+def create_item(request):
+    user_id = request.session['user_id']
+    
+    if request.params.get('mode') == 'bulk':
+        try:
+            report = bulk.import_items(request.conn, request.cursor, request.event, user_id,
+                                       request.header('Idempotency-Key') or None)
+        except bulk.BulkImportError as e:
+            raise HttpError(400, str(e))
+        finally:
+            # Часть порций могла закоммититься и до ошибки
+            listing_cache.invalidate()
+        return response(200, report)
+    
+    body = request.body
+    pricing = body.get('pricing')
+    if pricing is not None and not isinstance(pricing, dict):
+        raise HttpError(400, 'pricing должен быть объектом')
+    # Те же правила, по которым bookings считает стоимость: ошибка здесь, а не у арендатора
     try:
-        if method == 'GET':
-            params = event.get('queryStringParameters') or {}
-            category = params.get('category')
-            
-            if category and category != 'all':
-                cur.execute(
-                    """SELECT i.*, u.full_name as owner, u.rating as owner_rating, u.reviews_count as owner_reviews
-                       FROM items i
-                       JOIN users u ON i.user_id = u.id
-                       WHERE i.is_active = true AND i.category_id = %s
-                       ORDER BY i.created_at DESC""",
-                    (category,)
-                )
-            else:
-                cur.execute(
-                    """SELECT i.*, u.full_name as owner, u.rating as owner_rating, u.reviews_count as owner_reviews
-                       FROM items i
-                       JOIN users u ON i.user_id = u.id
-                       WHERE i.is_active = true
-                       ORDER BY i.created_at DESC"""
-                )
-            
-            items = cur.fetchall()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(item) for item in items], default=str),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            token = event['headers'].get('X-Authorization', '').replace('Bearer ', '')
-            
-            if not token:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Требуется авторизация'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute(
-                "SELECT user_id FROM user_sessions WHERE session_token = %s AND expires_at > NOW()",
-                (token,)
-            )
-            session = cur.fetchone()
-            
-            if not session:
-                return {
-                    'statusCode': 401,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Сессия истекла'}),
-                    'isBase64Encoded': False
-                }
-            
-            user_id = session['user_id']
-            
-            cur.execute(
-                """INSERT INTO items (user_id, title, description, category_id, price, period, location, condition, image_url, features, rules)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id""",
-                (
-                    user_id,
-                    body['title'],
-                    body.get('description', ''),
-                    body['category_id'],
-                    body['price'],
-                    body.get('period', 'день'),
-                    body.get('location', ''),
-                    body.get('condition', 'Хорошее'),
-                    body.get('image_url', ''),
-                    body.get('features', []),
-                    body.get('rules', [])
-                )
-            )
-            item_id = cur.fetchone()['id']
-            conn.commit()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'item_id': item_id}),
-                'isBase64Encoded': False
-            }
+        PriceModel(body['price'], body.get('period', 'день'), pricing)
+    except (TypeError, ArithmeticError):
+        raise HttpError(400, 'price должен быть числом')
+    latitude, longitude = geo.parse_coordinates(body)
+    
+    from psycopg2.extras import Json
+    cur = request.cursor
+    cur.execute(
+        """INSERT INTO items (user_id, title, description, category_id, price, period, location, condition, image_url, features, rules, latitude, longitude, pricing)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id""",
+        (
+            user_id,
+            body['title'],
+            body.get('description', ''),
+            body['category_id'],
+            body['price'],
+            body.get('period', 'день'),
+            body.get('location', ''),
+            body.get('condition', 'Хорошее'),
+            body.get('image_url', ''),
+            body.get('features', []),
+            body.get('rules', []),
+            latitude,
+            longitude,
+            Json(pricing) if pricing else None
+        )
+    )
+    item_id = cur.fetchone()['id']
+    # Сверка с сохранёнными поисками — в той же транзакции, что и вставка
+    matcher.enqueue_matches(cur, [item_id], 'new_item')
+    request.conn.commit()
+    listing_cache.invalidate()
+    
+    return response(200, {'item_id': item_id})
+
+
+@router.route('POST', 'upload_image', auth=True)
+def upload_image(request):
+    item_id = request.params.get('item_id', '')
+    if not item_id.isdigit():
+        raise HttpError(400, 'Параметр item_id обязателен')
+    
+    cur = request.cursor
+    cur.execute("SELECT user_id FROM items WHERE id = %s", (int(item_id),))
+    item = cur.fetchone()
+    if not item or item['user_id'] != request.session['user_id']:
+        raise HttpError(404, 'Объявление не найдено')
     
-    except Exception as e:
-        conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+    # Сырые байты приходят base64-телом, иначе — JSON {"data": "<base64>"}
+    body = None if request.event.get('isBase64Encoded') else request.body
+    try:
+        result = images.upload_item_image(request.conn, cur, request.event, body, int(item_id))
+    except images.ImageUploadError as e:
+        raise HttpError(400, str(e))
+    listing_cache.invalidate()
+    return response(200, result)
+
+
+@router.route('POST', 'save_search', auth=True)
+def save_search(request):
+    saved = matcher.create_saved_search(request.cursor, request.session['user_id'], request.body)
+    request.conn.commit()
+    return response(200, saved)
+
+
+@router.route('GET', 'saved_searches', auth=True)
+def get_saved_searches(request):
+    return response(200, matcher.list_saved_searches(request.cursor, request.session['user_id']))
+
+
+@router.route('DELETE', 'saved_search', auth=True)
+def delete_saved_search(request):
+    search_id = request.params.get('id', '')
+    if not search_id.isdigit():
+        raise HttpError(400, 'Параметр id обязателен')
+    if not matcher.delete_saved_search(request.cursor, request.session['user_id'], int(search_id)):
+        raise HttpError(404, 'Сохранённый поиск не найден')
+    request.conn.commit()
+    return response(200, {'success': True})
+
+
+@router.route('GET', 'notifications', auth=True)
+def get_notifications(request):
+    return response(200, matcher.user_notifications(request.cursor, request.session['user_id']))
+
+
+@router.route('GET', 'image')
+def get_image(request):
+    try:
+        data, content_type = images.read_local_image(request.params.get('key', ''))
+    except images.ImageUploadError:
+        # Ключ вне каталога хранилища
+        data = None
+    if data is None:
+        raise HttpError(404, 'Изображение не найдено')
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': content_type,
+            'Access-Control-Allow-Origin': '*',
+            # Ключ — хэш содержимого, файл по нему никогда не меняется
+            'Cache-Control': 'public, max-age=31536000, immutable',
+        },
+        'body': base64.b64encode(data).decode(),
+        'isBase64Encoded': True
+    }
+
+
+def handler(event: dict, context) -> dict:
+    return router.dispatch(event, context)
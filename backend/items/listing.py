@@ -0,0 +1,166 @@
+'''Построение запроса каталога: keyset-пагинация, фильтры и проекция полей'''
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Поле ответа -> SQL-выражение. id и created_at отдаются всегда: по ним строится курсор
+ITEM_FIELDS = {
+    'id': 'i.id',
+    'user_id': 'i.user_id',
+    'title': 'i.title',
+    'description': 'i.description',
+    'category_id': 'i.category_id',
+    'price': 'i.price',
+    'period': 'i.period',
+    'pricing': 'i.pricing',
+    'location': 'i.location',
+    'latitude': 'i.latitude',
+    'longitude': 'i.longitude',
+    'condition': 'i.condition',
+    'image_url': 'i.image_url',
+    'image_variants': 'i.image_variants',
+    'features': 'i.features',
+    'rules': 'i.rules',
+    'rating': 'i.rating',
+    'reviews_count': 'i.reviews_count',
+    'is_active': 'i.is_active',
+    'created_at': 'i.created_at',
+    'updated_at': 'i.updated_at',
+}
+OWNER_FIELDS = {
+    'owner': 'u.full_name',
+    'owner_rating': 'u.rating',
+    'owner_reviews': 'u.reviews_count',
+}
+
+
+class ListingParamsError(ValueError):
+    pass
+
+
+def encode_cursor(created_at, item_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, TypeError):
+        raise ListingParamsError('Некорректный курсор')
+
+
+def _parse_int(params: dict, name: str):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ListingParamsError(f'Параметр {name} должен быть числом')
+
+
+def parse_limit(params: dict) -> int:
+    limit = _parse_int(params, 'limit')
+    if limit is None:
+        return DEFAULT_LIMIT
+    if limit < 1:
+        raise ListingParamsError('Параметр limit должен быть положительным')
+    return min(limit, MAX_LIMIT)
+
+
+def select_clause(params: dict) -> tuple:
+    '''Возвращает (SQL-список колонок, нужен ли JOIN с users)'''
+    fields = params.get('fields')
+    if not fields:
+        # Явный список вместо i.*: служебные колонки вроде search_vector в ответ не попадают
+        columns = list(ITEM_FIELDS.values()) + [f'{expr} as {name}' for name, expr in OWNER_FIELDS.items()]
+        return ', '.join(columns), True
+
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in ITEM_FIELDS and f not in OWNER_FIELDS]
+    if unknown:
+        raise ListingParamsError(f'Неизвестные поля: {", ".join(unknown)}')
+
+    columns = ['i.id', 'i.created_at']
+    needs_owner = False
+    for name in requested:
+        if name in ('id', 'created_at'):
+            continue
+        if name in OWNER_FIELDS:
+            needs_owner = True
+            columns.append(f'{OWNER_FIELDS[name]} as {name}')
+        else:
+            columns.append(ITEM_FIELDS[name])
+    return ', '.join(columns), needs_owner
+
+
+def where_clause(params: dict) -> tuple:
+    conditions = ['i.is_active = true']
+    args = []
+
+    category = params.get('category')
+    if category and category != 'all':
+        conditions.append('i.category_id = %s')
+        args.append(category)
+
+    price_min = _parse_int(params, 'price_min')
+    if price_min is not None:
+        conditions.append('i.price >= %s')
+        args.append(price_min)
+
+    price_max = _parse_int(params, 'price_max')
+    if price_max is not None:
+        conditions.append('i.price <= %s')
+        args.append(price_max)
+
+    location = params.get('location')
+    if location:
+        conditions.append('i.location ILIKE %s')
+        args.append('%' + location.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+
+    condition = params.get('condition')
+    if condition:
+        conditions.append('i.condition = %s')
+        args.append(condition)
+
+    return conditions, args
+
+
+def build_listing_query(params: dict, paginated: bool) -> tuple:
+    '''Собирает запрос каталога. При paginated выбирается limit + 1 строка, чтобы узнать о следующей странице'''
+    columns, needs_owner = select_clause(params)
+    conditions, args = where_clause(params)
+
+    cursor = params.get('cursor')
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        conditions.append('(i.created_at, i.id) < (%s, %s)')
+        args.extend([created_at, item_id])
+
+    query = f'SELECT {columns} FROM items i'
+    if needs_owner:
+        query += ' JOIN users u ON i.user_id = u.id'
+    query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY i.created_at DESC, i.id DESC'
+
+    limit = None
+    if paginated:
+        limit = parse_limit(params)
+        query += ' LIMIT %s'
+        args.append(limit + 1)
+    return query, args, limit
+
+
+def paginate(rows: list, limit: int) -> dict:
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and page:
+        last = page[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    return {'items': [dict(row) for row in page], 'next_cursor': next_cursor}
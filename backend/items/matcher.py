@@ -0,0 +1,264 @@
+'''Сохранённые поиски: инвертированный индекс, очередь совпадений и outbox уведомлений.
+
+Одинаковая копия модуля лежит в каталоге каждой функции. Поиск раскладывается в
+saved_search_index по (категория или '*', ценовая корзина) — одна строка на каждую
+корзину, которую задевает его диапазон цен. Новое объявление (items) или освободившиеся
+даты (bookings) кладут item_id в match_queue в той же транзакции. Обработчик очереди
+берёт порцию через FOR UPDATE SKIP LOCKED и одним запросом находит кандидатов по
+индексу — только поиски из корзины цены вещи и её категории, — проверяет точные условия
+и пишет уведомления в notification_outbox. Outbox разбирается порциями отдельно.
+'''
+import bisect
+import json
+import os
+import sys
+import urllib.request
+from datetime import date
+
+# Границы ценовых корзин: корзина k — цены из [PRICE_BOUNDS[k-1], PRICE_BOUNDS[k])
+PRICE_BOUNDS = [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000]
+ANY_CATEGORY = '*'
+MATCH_BATCH_SIZE = int(os.environ.get('MATCH_BATCH_SIZE', '200'))
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '100'))
+# Куда отправлять уведомления; без адреса они пишутся в лог функции
+NOTIFICATION_WEBHOOK_URL = os.environ.get('NOTIFICATION_WEBHOOK_URL', '')
+MAX_DELIVERY_ATTEMPTS = 5
+MAX_SAVED_SEARCHES = 20
+# Ограничения колонок saved_searches
+MAX_PRICE = 2147483647
+MAX_LOCATION_LENGTH = 255
+
+
+class SavedSearchError(ValueError):
+    pass
+
+
+def price_bucket(price: int) -> int:
+    '''То же, что width_bucket(price, PRICE_BOUNDS) в SQL'''
+    return bisect.bisect_right(PRICE_BOUNDS, price)
+
+
+def buckets_for_range(price_min, price_max) -> list:
+    low = price_bucket(price_min) if price_min is not None else 0
+    high = price_bucket(price_max) if price_max is not None else len(PRICE_BOUNDS)
+    return list(range(low, high + 1))
+
+
+def _optional_int(body: dict, name: str):
+    value = body.get(name)
+    if value in (None, ''):
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise SavedSearchError(f'{name} должен быть целым числом')
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise SavedSearchError(f'{name} должен быть целым числом')
+    if not 0 <= value <= MAX_PRICE:
+        raise SavedSearchError(f'{name} должен быть от 0 до {MAX_PRICE}')
+    return value
+
+
+def _optional_date(body: dict, name: str):
+    value = body.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise SavedSearchError(f'{name} должен быть датой в формате ГГГГ-ММ-ДД')
+
+
+def _optional_location(body: dict):
+    value = body.get('location')
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str):
+        raise SavedSearchError('location должен быть строкой')
+    value = value.strip()
+    if len(value) > MAX_LOCATION_LENGTH:
+        raise SavedSearchError(f'location не длиннее {MAX_LOCATION_LENGTH} символов')
+    return value or None
+
+
+def parse_saved_search(body: dict) -> dict:
+    search = {
+        'category_id': body.get('category_id') or None,
+        'price_min': _optional_int(body, 'price_min'),
+        'price_max': _optional_int(body, 'price_max'),
+        'location': _optional_location(body),
+        'start_date': _optional_date(body, 'start_date'),
+        'end_date': _optional_date(body, 'end_date'),
+    }
+    if search['category_id'] == 'all':
+        search['category_id'] = None
+    if search['price_min'] is not None and search['price_max'] is not None and search['price_min'] > search['price_max']:
+        raise SavedSearchError('price_min больше price_max')
+    if (search['start_date'] is None) != (search['end_date'] is None):
+        raise SavedSearchError('start_date и end_date задаются вместе')
+    if search['start_date'] and search['end_date'] < search['start_date']:
+        raise SavedSearchError('Дата окончания раньше даты начала')
+    return search
+
+
+def create_saved_search(cur, user_id: int, body: dict) -> dict:
+    search = parse_saved_search(body)
+    if search['category_id'] is not None:
+        if not isinstance(search['category_id'], str):
+            raise SavedSearchError('category_id должен быть строкой')
+        cur.execute("SELECT 1 FROM categories WHERE id = %s", (search['category_id'],))
+        if not cur.fetchone():
+            raise SavedSearchError(f'Неизвестная категория: {search["category_id"]}')
+    cur.execute("SELECT count(*) as total FROM saved_searches WHERE user_id = %s AND is_active = true", (user_id,))
+    if cur.fetchone()['total'] >= MAX_SAVED_SEARCHES:
+        raise SavedSearchError(f'Не больше {MAX_SAVED_SEARCHES} сохранённых поисков')
+
+    cur.execute(
+        """INSERT INTO saved_searches (user_id, category_id, price_min, price_max, location, start_date, end_date)
+           VALUES (%(user_id)s, %(category_id)s, %(price_min)s, %(price_max)s, %(location)s, %(start_date)s, %(end_date)s)
+           RETURNING id, category_id, price_min, price_max, location, start_date, end_date, created_at""",
+        {**search, 'user_id': user_id}
+    )
+    saved = cur.fetchone()
+    cur.execute(
+        """INSERT INTO saved_search_index (category_key, price_bucket, search_id)
+           SELECT %s, unnest(%s::int[]), %s""",
+        (search['category_id'] or ANY_CATEGORY, buckets_for_range(search['price_min'], search['price_max']), saved['id'])
+    )
+    return dict(saved)
+
+
+def delete_saved_search(cur, user_id: int, search_id: int) -> bool:
+    cur.execute(
+        "UPDATE saved_searches SET is_active = false WHERE id = %s AND user_id = %s AND is_active = true RETURNING id",
+        (search_id, user_id)
+    )
+    if not cur.fetchone():
+        return False
+    cur.execute("DELETE FROM saved_search_index WHERE search_id = %s", (search_id,))
+    return True
+
+
+def list_saved_searches(cur, user_id: int) -> list:
+    cur.execute(
+        """SELECT id, category_id, price_min, price_max, location, start_date, end_date, created_at
+           FROM saved_searches WHERE user_id = %s AND is_active = true ORDER BY id""",
+        (user_id,)
+    )
+    return cur.fetchall()
+
+
+def enqueue_matches(cur, item_ids: list, reason: str):
+    '''Вызывается в транзакции, которая создала вещь или освободила её даты'''
+    if item_ids:
+        cur.execute(
+            "INSERT INTO match_queue (item_id, reason) SELECT unnest(%s::int[]), %s",
+            (list(item_ids), reason)
+        )
+
+
+MATCH_SQL = """
+    WITH jobs AS (
+        DELETE FROM match_queue WHERE id IN (
+            SELECT id FROM match_queue ORDER BY id LIMIT %(batch_size)s FOR UPDATE SKIP LOCKED
+        )
+        RETURNING item_id, reason
+    )
+    INSERT INTO notification_outbox (user_id, saved_search_id, item_id, reason, payload)
+    SELECT DISTINCT ON (s.id, i.id)
+           s.user_id, s.id, i.id, j.reason,
+           jsonb_build_object('title', i.title, 'price', i.price, 'period', i.period,
+                              'category_id', i.category_id, 'location', i.location, 'image_url', i.image_url)
+    FROM jobs j
+    JOIN items i ON i.id = j.item_id AND i.is_active = true
+    JOIN saved_search_index x
+      ON x.category_key IN (i.category_id, %(any_category)s)
+     AND x.price_bucket = width_bucket(i.price, %(bounds)s::int[])
+    JOIN saved_searches s ON s.id = x.search_id AND s.is_active = true
+    WHERE s.user_id <> i.user_id
+      AND (s.price_min IS NULL OR i.price >= s.price_min)
+      AND (s.price_max IS NULL OR i.price <= s.price_max)
+      AND (s.location IS NULL OR strpos(lower(i.location), lower(s.location)) > 0)
+      AND (s.start_date IS NULL OR NOT EXISTS (
+              SELECT 1 FROM bookings b
+              WHERE b.item_id = i.id AND b.status IN ('pending', 'confirmed', 'active')
+                AND daterange(b.start_date, b.end_date, '[]') && daterange(s.start_date, s.end_date, '[]')
+          ))
+    ORDER BY s.id, i.id
+    ON CONFLICT (saved_search_id, item_id) WHERE sent_at IS NULL DO NOTHING
+"""
+
+
+def process_match_queue(conn, cur, batch_size: int = MATCH_BATCH_SIZE, max_batches: int = 50) -> dict:
+    '''Разбирает match_queue порциями; параллельные запуски берут разные порции'''
+    batches = 0
+    queued = 0
+    for _ in range(max_batches):
+        cur.execute(MATCH_SQL, {'batch_size': batch_size, 'any_category': ANY_CATEGORY, 'bounds': PRICE_BOUNDS})
+        queued += cur.rowcount
+        # Строки, взятые параллельными обработчиками, не считаются
+        cur.execute("SELECT id FROM match_queue LIMIT 1 FOR UPDATE SKIP LOCKED")
+        pending = cur.fetchone() is not None
+        conn.commit()
+        batches += 1
+        if not pending:
+            break
+    return {'batches': batches, 'notifications_queued': queued}
+
+
+def _deliver(rows: list):
+    payload = [
+        {'id': row['id'], 'user_id': row['user_id'], 'saved_search_id': row['saved_search_id'],
+         'item_id': row['item_id'], 'reason': row['reason'], 'item': row['payload']}
+        for row in rows
+    ]
+    if not NOTIFICATION_WEBHOOK_URL:
+        for notification in payload:
+            sys.stdout.write(json.dumps({'level': 'INFO', 'message': 'notification', **notification},
+                                        ensure_ascii=False) + '\n')
+        return
+    data = json.dumps({'notifications': payload}, ensure_ascii=False).encode()
+    request = urllib.request.Request(NOTIFICATION_WEBHOOK_URL, data=data,
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=10) as result:
+        result.read()
+
+
+def drain_outbox(conn, cur, batch_size: int = OUTBOX_BATCH_SIZE, max_batches: int = 20) -> dict:
+    '''Отправляет неотправленные уведомления порциями; неудачная порция остаётся в outbox'''
+    sent = 0
+    failed = 0
+    for _ in range(max_batches):
+        cur.execute(
+            """SELECT id, user_id, saved_search_id, item_id, reason, payload FROM notification_outbox
+               WHERE sent_at IS NULL AND attempts < %s
+               ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED""",
+            (MAX_DELIVERY_ATTEMPTS, batch_size)
+        )
+        rows = cur.fetchall()
+        if not rows:
+            conn.commit()
+            break
+        ids = [row['id'] for row in rows]
+        try:
+            _deliver(rows)
+        except OSError:
+            cur.execute("UPDATE notification_outbox SET attempts = attempts + 1 WHERE id = ANY(%s)", (ids,))
+            conn.commit()
+            failed += len(ids)
+            break
+        cur.execute("UPDATE notification_outbox SET sent_at = NOW() WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+        sent += len(ids)
+        if len(rows) < batch_size:
+            break
+    return {'sent': sent, 'failed': failed}
+
+
+def user_notifications(cur, user_id: int, limit: int = 50) -> list:
+    cur.execute(
+        """SELECT id, saved_search_id, item_id, reason, payload, created_at FROM notification_outbox
+           WHERE user_id = %s ORDER BY id DESC LIMIT %s""",
+        (user_id, limit)
+    )
+    return cur.fetchall()
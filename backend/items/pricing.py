@@ -0,0 +1,212 @@
+'''Расчёт стоимости аренды: ставка по периоду объявления, сезонные коэффициенты, скидки за срок, залог.
+
+items.pricing (JSONB, может быть NULL):
+    {"discounts": [{"min_days": 7, "percent": 10}, {"min_days": 30, "percent": 25}],
+     "seasons": [{"start": "12-20", "end": "01-10", "multiplier": 1.5}],
+     "deposit": 5000}
+Сезон задаётся днями года ММ-ДД и может переходить через Новый год. Скидка — от 0 до 100 %,
+коэффициент сезона больше нуля, залог не отрицательный; items проверяет настройки той же
+моделью при создании объявления. Одинаковая копия модуля лежит в каталоге каждой функции.
+
+Разобранная модель цены кэшируется по (item_id, price_version): версия увеличивается
+триггером при любом изменении price, period или pricing (V0013), поэтому старые записи
+просто перестают запрашиваться. quote_many считает много интервалов за один проход по
+префиксным суммам дневных ставок — для календаря цен.
+'''
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+# Аренда по часам считается днями; столько часов входит в арендный день
+HOURS_PER_DAY = int(os.environ.get('PRICING_HOURS_PER_DAY', '8'))
+PERIOD_DAYS = {'день': 1, 'неделя': 7, 'месяц': 30}
+MAX_QUOTE_RANGES = 366
+# Дневные ставки одного quote_many считаются не дальше этого охвата
+MAX_QUOTE_SPAN_DAYS = 731
+QUOTE_CACHE_SIZE = int(os.environ.get('QUOTE_CACHE_SIZE', '1024'))
+
+
+class PricingError(ValueError):
+    pass
+
+
+def _money(value: Decimal) -> int:
+    return int(value.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def _month_day(value: str, name: str) -> tuple:
+    try:
+        month, day = (int(part) for part in value.split('-'))
+        date(2000, month, day)
+    except (AttributeError, ValueError):
+        raise PricingError(f'Поле {name} сезона должно иметь вид ММ-ДД')
+    return month, day
+
+
+class PriceModel:
+    def __init__(self, price: int, period: str, pricing: dict = None):
+        pricing = pricing or {}
+        if not isinstance(pricing, dict):
+            raise PricingError('Настройки цены должны быть объектом')
+
+        if period == 'час':
+            self.daily_rate = Decimal(price) * HOURS_PER_DAY
+        else:
+            self.daily_rate = Decimal(price) / PERIOD_DAYS.get(period or 'день', 1)
+
+        try:
+            self.discounts = sorted(
+                (int(tier['min_days']), Decimal(str(tier['percent'])))
+                for tier in pricing.get('discounts') or []
+            )
+            self.seasons = [
+                (_month_day(season['start'], 'start'), _month_day(season['end'], 'end'),
+                 Decimal(str(season['multiplier'])))
+                for season in pricing.get('seasons') or []
+            ]
+            self.deposit = int(pricing.get('deposit') or 0)
+        except PricingError:
+            raise
+        except (KeyError, TypeError, ArithmeticError, ValueError):
+            raise PricingError('Некорректные настройки цены')
+
+        for min_days, percent in self.discounts:
+            if min_days < 1 or not percent.is_finite() or not Decimal(0) <= percent <= Decimal(100):
+                raise PricingError('Скидка задаётся для min_days от 1 и percent от 0 до 100')
+        for _, _, multiplier in self.seasons:
+            if not multiplier.is_finite() or multiplier <= 0:
+                raise PricingError('Коэффициент сезона должен быть больше нуля')
+        if self.deposit < 0:
+            raise PricingError('Залог не может быть отрицательным')
+
+    def multiplier(self, day: date) -> Decimal:
+        key = (day.month, day.day)
+        for start, end, multiplier in self.seasons:
+            inside = start <= key <= end if start <= end else (key >= start or key <= end)
+            if inside:
+                return multiplier
+        return Decimal(1)
+
+    def discount_percent(self, days: int) -> Decimal:
+        percent = Decimal(0)
+        for min_days, tier_percent in self.discounts:
+            if days >= min_days:
+                percent = tier_percent
+        return percent
+
+    def _quote(self, start: date, end: date, subtotal: Decimal) -> dict:
+        days = (end - start).days + 1
+        percent = self.discount_percent(days)
+        discount = subtotal * percent / 100
+        return {
+            'start_date': start,
+            'end_date': end,
+            'total_days': days,
+            'subtotal': _money(subtotal),
+            'discount_percent': float(percent),
+            'discount': _money(discount),
+            'total_price': _money(subtotal - discount),
+            'deposit': self.deposit,
+        }
+
+    def quote(self, start: date, end: date) -> dict:
+        return self.quote_many([(start, end)])[0]
+
+    def quote_many(self, ranges: list) -> list:
+        '''Стоимость каждого интервала [start, end]; дневные ставки считаются один раз на общий охват'''
+        if not ranges:
+            return []
+        for start, end in ranges:
+            if end < start:
+                raise PricingError('Дата окончания раньше даты начала')
+        first = min(start for start, _ in ranges)
+        last = max(end for _, end in ranges)
+        if (last - first).days + 1 > MAX_QUOTE_SPAN_DAYS:
+            raise PricingError(f'Интервалы должны укладываться в {MAX_QUOTE_SPAN_DAYS} дней')
+
+        if not self.seasons:
+            return [self._quote(start, end, self.daily_rate * ((end - start).days + 1)) for start, end in ranges]
+
+        # prefix[k] — сумма дневных ставок за дни first .. first + k - 1
+        prefix = [Decimal(0)]
+        day = first
+        while day <= last:
+            prefix.append(prefix[-1] + self.daily_rate * self.multiplier(day))
+            day += timedelta(days=1)
+        return [
+            self._quote(start, end, prefix[(end - first).days + 1] - prefix[(start - first).days])
+            for start, end in ranges
+        ]
+
+
+class QuoteCache:
+    '''LRU разобранных моделей цены по (item_id, price_version)'''
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def model(self, item: dict) -> PriceModel:
+        key = (item['id'], item['price_version'])
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            self.misses += 1
+        model = PriceModel(item['price'], item['period'], item['pricing'])
+        with self._lock:
+            self._models[key] = model
+            while len(self._models) > self.maxsize:
+                self._models.popitem(last=False)
+        return model
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._models), 'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': self.hits / lookups if lookups else 0.0}
+
+
+quote_cache = QuoteCache(QUOTE_CACHE_SIZE)
+
+PRICED_ITEM_SQL = """
+    SELECT i.id, i.price, i.period, i.pricing, i.price_version, i.is_active,
+           EXISTS (
+               SELECT 1 FROM bookings b
+               WHERE b.item_id = i.id AND b.status IN %s
+                 AND daterange(b.start_date, b.end_date, '[]') && daterange(%s, %s, '[]')
+           ) AS is_busy
+    FROM items i WHERE i.id = %s
+"""
+
+
+def fetch_priced_item(cur, item_id: int, start: date, end: date, blocking_statuses: tuple):
+    '''Цена и занятость вещи на интервал одним запросом'''
+    cur.execute(PRICED_ITEM_SQL, (blocking_statuses, start, end, item_id))
+    return cur.fetchone()
+
+
+def fetch_item_pricing(cur, item_id: int):
+    cur.execute("SELECT id, price, period, pricing, price_version FROM items WHERE id = %s", (item_id,))
+    return cur.fetchone()
+
+
+def parse_ranges(value, parse_date) -> list:
+    '''"ГГГГ-ММ-ДД:ГГГГ-ММ-ДД,..." -> [(date, date), ...]'''
+    parts = [part.strip() for part in (value or '').split(',') if part.strip()]
+    if not parts:
+        raise PricingError('Параметр ranges обязателен')
+    if len(parts) > MAX_QUOTE_RANGES:
+        raise PricingError(f'Не больше {MAX_QUOTE_RANGES} интервалов за запрос')
+    ranges = []
+    for part in parts:
+        start_value, _, end_value = part.partition(':')
+        ranges.append((parse_date(start_value, 'start_date'), parse_date(end_value or start_value, 'end_date')))
+    return ranges
@@ -0,0 +1,81 @@
+'''Полнотекстовый поиск по объявлениям: tsvector (russian) + триграммы для опечаток'''
+import base64
+import json
+import re
+from listing import ListingParamsError, parse_limit, select_clause, where_clause
+
+MAX_QUERY_LENGTH = 200
+# Глубже листать ранжированную выдачу смысла нет, а OFFSET дорожает линейно
+MAX_OFFSET = 1000
+HEADLINE_OPTIONS = 'MaxFragments=2, MaxWords=20, MinWords=5, StartSel=<mark>, StopSel=</mark>'
+
+
+def prefix_tsquery(text: str) -> str:
+    '''"дрель мак" -> "дрель:* & мак:*" — каждое слово ищется как префикс'''
+    words = re.findall(r'\w+', text.lower())
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def encode_offset(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({'o': offset}).encode()).decode().rstrip('=')
+
+
+def decode_offset(cursor: str) -> int:
+    try:
+        offset = int(json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))['o'])
+    except (ValueError, TypeError, KeyError):
+        raise ListingParamsError('Некорректный курсор')
+    if offset < 0 or offset > MAX_OFFSET:
+        raise ListingParamsError('Некорректный курсор')
+    return offset
+
+
+def build_search_query(params: dict) -> tuple:
+    '''Страница ранжированной выдачи. Сниппеты (ts_headline) считаются только для строк страницы'''
+    text = (params.get('q') or '').strip()
+    if not text or len(text) > MAX_QUERY_LENGTH:
+        raise ListingParamsError(f'Поисковый запрос должен быть от 1 до {MAX_QUERY_LENGTH} символов')
+    tsquery = prefix_tsquery(text)
+    if not tsquery:
+        raise ListingParamsError('Поисковый запрос не содержит слов')
+
+    columns, needs_owner = select_clause(params)
+    conditions, filter_args = where_clause(params)
+    limit = parse_limit(params)
+    offset = decode_offset(params['cursor']) if params.get('cursor') else 0
+
+    conditions.append("(i.search_vector @@ to_tsquery('russian', %s) OR %s <%% i.title)")
+    joins = ' JOIN users u ON i.user_id = u.id' if needs_owner else ''
+
+    # tsquery подставляется литералом в каждое место, чтобы планировщик видел константу и брал GIN-индексы
+    query = f"""
+        SELECT page.*,
+               ts_headline('russian', page._title, to_tsquery('russian', %s),
+                           'HighlightAll=true, StartSel=<mark>, StopSel=</mark>') AS title_highlight,
+               ts_headline('russian', coalesce(page._description, ''), to_tsquery('russian', %s),
+                           '{HEADLINE_OPTIONS}') AS snippet
+        FROM (
+            SELECT {columns},
+                   ts_rank_cd(i.search_vector, to_tsquery('russian', %s)) + word_similarity(%s, i.title) AS rank,
+                   i.title AS _title, i.description AS _description
+            FROM items i{joins}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY rank DESC, i.id DESC
+            LIMIT %s OFFSET %s
+        ) page
+        ORDER BY page.rank DESC, page.id DESC
+    """
+    args = [tsquery, tsquery, tsquery, text] + filter_args + [tsquery, text, limit + 1, offset]
+    return query, args, limit, offset
+
+
+def paginate_search(rows: list, limit: int, offset: int) -> dict:
+    page = []
+    for row in rows[:limit]:
+        item = dict(row)
+        item.pop('_title', None)
+        item.pop('_description', None)
+        page.append(item)
+    next_offset = offset + limit
+    next_cursor = encode_offset(next_offset) if len(rows) > limit and next_offset <= MAX_OFFSET else None
+    return {'items': page, 'next_cursor': next_cursor}
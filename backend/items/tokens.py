@@ -0,0 +1,139 @@
+'''Подписанные токены сессий: проверка без обращения к user_sessions.
+
+Формат: s1.<kid>.<payload>.<signature>, payload — base64url JSON {uid, typ, exp, jti},
+подпись — HMAC-SHA256 ключом kid. Ключи задаются в SESSION_SIGNING_KEYS как
+"kid1:secret1,kid2:secret2"; новые токены подписываются ключом SESSION_SIGNING_KEY_ID,
+старые ключи остаются в списке до истечения выданных ими токенов.
+Одинаковая копия модуля лежит в каталоге каждой функции.
+'''
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+TOKEN_PREFIX = 's1'
+SESSION_TOKEN_MODE = os.environ.get('SESSION_TOKEN_MODE', 'opaque')
+# Как часто инстанс перечитывает список отозванных токенов
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH', '30'))
+
+
+def _load_keys() -> dict:
+    keys = {}
+    for pair in os.environ.get('SESSION_SIGNING_KEYS', '').split(','):
+        if ':' in pair:
+            kid, secret = pair.split(':', 1)
+            keys[kid.strip()] = secret.strip().encode()
+    return keys
+
+
+SIGNING_KEYS = _load_keys()
+ACTIVE_KEY_ID = os.environ.get('SESSION_SIGNING_KEY_ID') or next(iter(SIGNING_KEYS), None)
+
+
+def signed_mode_enabled() -> bool:
+    return SESSION_TOKEN_MODE == 'signed' and ACTIVE_KEY_ID in SIGNING_KEYS
+
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(TOKEN_PREFIX + '.')
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(kid: str, payload: str) -> str:
+    message = f'{TOKEN_PREFIX}.{kid}.{payload}'.encode()
+    return _b64encode(hmac.new(SIGNING_KEYS[kid], message, hashlib.sha256).digest())
+
+
+def issue_signed_token(user_id: int, user_type: str, ttl_seconds: int) -> tuple:
+    '''Возвращает (токен, unix-время истечения)'''
+    expires = int(time.time()) + ttl_seconds
+    claims = {'uid': user_id, 'typ': user_type, 'exp': expires, 'jti': secrets.token_urlsafe(12)}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{TOKEN_PREFIX}.{ACTIVE_KEY_ID}.{payload}.{_sign(ACTIVE_KEY_ID, payload)}', expires
+
+
+def decode_signed_token(token: str):
+    '''Проверяет подпись и срок действия; возвращает claims или None'''
+    parts = token.split('.')
+    if len(parts) != 4 or parts[0] != TOKEN_PREFIX:
+        return None
+    _, kid, payload, signature = parts
+    if kid not in SIGNING_KEYS:
+        return None
+    # Байты, а не str: compare_digest отвергает строки с не-ASCII символами через TypeError
+    if not hmac.compare_digest(_sign(kid, payload).encode(), signature.encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', 0) <= time.time():
+        return None
+    return claims
+
+
+class RevocationList:
+    '''Небольшой список отозванных jti, который перечитывается из базы раз в refresh секунд'''
+
+    def __init__(self, refresh: float):
+        self.refresh = refresh
+        self._revoked = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh
+
+    def contains(self, cur, jti: str) -> bool:
+        if self._stale():
+            cur.execute("SELECT jti FROM revoked_session_tokens WHERE expires_at > NOW()")
+            revoked = {row['jti'] for row in cur.fetchall()}
+            with self._lock:
+                self._revoked = revoked
+                self._loaded_at = time.monotonic()
+        return jti in self._revoked
+
+    def add(self, jti: str):
+        with self._lock:
+            self._revoked.add(jti)
+
+
+_revocations = RevocationList(REVOCATION_REFRESH_SECONDS)
+
+
+def verify_signed_token(cur, token: str):
+    '''Возвращает сессию в том же виде, что и sessions.resolve_session, без email и full_name'''
+    claims = decode_signed_token(token)
+    if claims is None or _revocations.contains(cur, claims['jti']):
+        return None
+    return {
+        'user_id': claims['uid'],
+        'user_type': claims['typ'],
+        'email': None,
+        'full_name': None,
+        'expires_at': claims['exp'],
+    }
+
+
+def revoke_signed_token(cur, token: str) -> bool:
+    claims = decode_signed_token(token)
+    if claims is None:
+        return False
+    cur.execute(
+        """INSERT INTO revoked_session_tokens (jti, expires_at)
+           VALUES (%s, to_timestamp(%s)) ON CONFLICT (jti) DO NOTHING""",
+        (claims['jti'], claims['exp'])
+    )
+    _revocations.add(claims['jti'])
+    return True
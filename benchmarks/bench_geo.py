@@ -0,0 +1,92 @@
+'''Бенчмарк поиска «рядом со мной» (GET /items?near=...) на синтетическом каталоге.
+
+Запуск: DATABASE_URL=postgresql://... python benchmarks/bench_geo.py --rows 1000000
+'''
+import argparse
+import os
+import random
+import time
+from common import use_function, report, summarize
+
+use_function('items')
+
+import psycopg2  # noqa: E402
+from psycopg2.extras import RealDictCursor  # noqa: E402
+from geo import build_near_query  # noqa: E402
+
+CITIES = [(55.7558, 37.6173), (59.9343, 30.3351), (56.8389, 60.6057), (55.0084, 82.9357), (43.5855, 39.7231)]
+TARGET_P95_MS = 50.0
+SEED_CHUNK = 100000
+
+
+def seed(conn, rows):
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO users (email, password_hash, full_name, user_type)
+           VALUES ('bench-geo@example.com', 'x', 'Bench Owner', 'owner')
+           ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name RETURNING id"""
+    )
+    user_id = cur.fetchone()[0]
+    lats = [lat for lat, _ in CITIES]
+    lons = [lon for _, lon in CITIES]
+    for start in range(0, rows, SEED_CHUNK):
+        count = min(SEED_CHUNK, rows - start)
+        # Точки разбросаны нормально вокруг городов, примерно в пределах 30 км
+        cur.execute(
+            """INSERT INTO items (user_id, title, category_id, price, latitude, longitude)
+               SELECT %(user_id)s, 'Объявление ' || g, 'tools', 100 + g %% 5000,
+                      (%(lats)s::float8[])[1 + g %% %(n)s] + (random() - 0.5) * 0.5,
+                      (%(lons)s::float8[])[1 + g %% %(n)s] + (random() - 0.5) * 0.8
+               FROM generate_series(%(first)s, %(last)s) g""",
+            {'user_id': user_id, 'lats': lats, 'lons': lons, 'n': len(CITIES), 'first': start + 1, 'last': start + count}
+        )
+        conn.commit()
+        print(f'seeded {start + count}/{rows}')
+    cur.execute('ANALYZE items')
+    conn.commit()
+    cur.close()
+
+
+def run(conn, repeats, radii):
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    rng = random.Random(42)
+    all_samples = []
+    for radius in radii:
+        samples = []
+        for _ in range(repeats):
+            lat, lon = rng.choice(CITIES)
+            params = {'near': f'{lat + rng.uniform(-0.1, 0.1)},{lon + rng.uniform(-0.1, 0.1)}',
+                      'radius_km': str(radius), 'limit': '20', 'fields': 'title,price'}
+            query, args, _ = build_near_query(params)
+            started = time.perf_counter()
+            cur.execute(query, args)
+            cur.fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        report(f'radius_km={radius}', samples)
+        all_samples.extend(samples)
+    report('all radii', all_samples)
+    p95 = summarize(all_samples)['p95_ms']
+    print(f'p95 {p95:.2f}ms {"<=" if p95 <= TARGET_P95_MS else ">"} target {TARGET_P95_MS:.0f}ms')
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--radii', default='1,5,10,25')
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], options=f'-c search_path={schema}')
+    try:
+        if not args.skip_seed:
+            seed(conn, args.rows)
+        run(conn, args.repeats, [float(r) for r in args.radii.split(',')])
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
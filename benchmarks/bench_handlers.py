@@ -0,0 +1,84 @@
+'''Холодный старт и накладные расходы обвязки каждой функции без обращения к базе.
+
+Холодный старт — время импорта index в свежем процессе. Накладные расходы на запрос —
+OPTIONS, запрос без токена (401) и сериализация типичного ответа каталога.
+
+Запуск: python benchmarks/bench_handlers.py
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from common import BACKEND_DIR, use_function, report
+
+FUNCTIONS = ('auth', 'items', 'bookings')
+IMPORT_SNIPPET = 'import time; t = time.perf_counter(); import index; print((time.perf_counter() - t) * 1000)'
+
+
+def cold_start(name, runs):
+    cwd = os.path.join(BACKEND_DIR, name)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=cwd, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append(float(output.strip()))
+    return samples
+
+
+def per_request(handler, event, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        handler(event, None)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def listing_payload(rows):
+    return [{
+        'id': i, 'title': f'Дрель {i}', 'description': 'Описание ' * 20, 'price': 500, 'period': 'день',
+        'rating': Decimal('4.75'), 'created_at': datetime(2024, 1, 1, 12, 0, i % 60),
+        'features': ['Кейс', 'Два аккумулятора'], 'owner': 'Иван',
+    } for i in range(rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cold-runs', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    for name in FUNCTIONS:
+        report(f'{name}: cold import', cold_start(name, args.cold_runs))
+
+    for name in FUNCTIONS:
+        use_function(name)
+        import index
+        report(f'{name}: OPTIONS', per_request(index.handler, {'httpMethod': 'OPTIONS'}, args.repeats))
+        method = 'POST' if name != 'auth' else 'PUT'
+        report(f'{name}: {method} rejected', per_request(index.handler, {'httpMethod': method, 'headers': {}}, args.repeats))
+        del sys.modules['index']
+
+    use_function('items')
+    import api
+    payload = listing_payload(100)
+    samples = []
+    for _ in range(args.repeats // 10):
+        started = time.perf_counter()
+        api.dumps(payload)
+        samples.append((time.perf_counter() - started) * 1000)
+    report(f'dumps 100 items ({"orjson" if api.orjson else "json"})', samples)
+    samples = []
+    for _ in range(args.repeats // 10):
+        started = time.perf_counter()
+        json.dumps(payload, default=str)
+        samples.append((time.perf_counter() - started) * 1000)
+    report('json.dumps(default=str)', samples)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''Сравнение задержки: новое соединение на каждый запрос против пула из backend/*/db.py.
+
+Запуск: DATABASE_URL=postgresql://... python benchmarks/bench_pool.py --requests 200
+'''
+import argparse
+import os
+import time
+from common import use_function, report
+
+use_function('items')
+
+import psycopg2  # noqa: E402
+from db import ConnectionPool  # noqa: E402
+
+QUERY = 'SELECT 1'
+
+
+def run_per_request(dsn, schema, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        conn = psycopg2.connect(dsn, options=f'-c search_path={schema}')
+        cur = conn.cursor()
+        cur.execute(QUERY)
+        cur.fetchall()
+        cur.close()
+        conn.close()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def run_pooled(dsn, schema, n, mode):
+    pool = ConnectionPool(dsn, schema, minconn=1, maxconn=2, mode=mode)
+    samples = []
+    try:
+        for _ in range(n):
+            started = time.perf_counter()
+            conn = pool.getconn()
+            cur = conn.cursor()
+            cur.execute(QUERY)
+            cur.fetchall()
+            cur.close()
+            pool.putconn(conn)
+            samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        pool.closeall()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--mode', choices=('session', 'transaction'), default='session')
+    args = parser.parse_args()
+
+    dsn = os.environ['DATABASE_URL']
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+    report('connect per request', run_per_request(dsn, schema, args.requests))
+    report(f'pooled ({args.mode})', run_pooled(dsn, schema, args.requests, args.mode))
+
+
+if __name__ == '__main__':
+    main()
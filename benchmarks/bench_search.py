@@ -0,0 +1,104 @@
+'''Бенчмарк поиска по объявлениям на синтетическом каталоге.
+
+Заполняет базу из DATABASE_URL (одноразовую, с применёнными db_migrations) синтетическими
+объявлениями и замеряет задержку поисковых запросов функции items.
+
+Запуск: DATABASE_URL=postgresql://... python benchmarks/bench_search.py --rows 1000000
+'''
+import argparse
+import os
+import time
+from common import use_function, report
+
+use_function('items')
+
+import psycopg2  # noqa: E402
+from psycopg2.extras import RealDictCursor  # noqa: E402
+from search import build_search_query  # noqa: E402
+
+NOUNS = ['Дрель', 'Перфоратор', 'Шуруповёрт', 'Палатка', 'Велосипед', 'Самокат', 'Ноутбук', 'Проектор',
+         'Лестница', 'Бетономешалка', 'Спальник', 'Байдарка', 'Диван', 'Кресло', 'Фотоаппарат', 'Генератор']
+BRANDS = ['Bosch', 'Makita', 'Metabo', 'DeWalt', 'Stels', 'Xiaomi', 'Canon', 'Lenovo', 'Tramp', 'Husqvarna']
+ADJECTIVES = ['мощный', 'лёгкий', 'компактный', 'профессиональный', 'надёжный', 'новый', 'складной']
+CATEGORIES = ['tools', 'electronics', 'sports', 'furniture', 'camping']
+QUERIES = ['дрель', 'перфоратор bosch', 'палатка tramp', 'велосипед', 'дрел', 'шуруповерт', 'пaлатка',
+           'компактный проектор', 'генератор husqvarna', 'байдарка складная']
+
+SEED_CHUNK = 100000
+
+
+def seed(conn, rows):
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO users (email, password_hash, full_name, user_type)
+           VALUES ('bench-search@example.com', 'x', 'Bench Owner', 'owner')
+           ON CONFLICT (email) DO UPDATE SET full_name = EXCLUDED.full_name RETURNING id"""
+    )
+    user_id = cur.fetchone()[0]
+    conn.commit()
+
+    for start in range(0, rows, SEED_CHUNK):
+        count = min(SEED_CHUNK, rows - start)
+        cur.execute(
+            """INSERT INTO items (user_id, title, description, category_id, price, location, condition, features)
+               SELECT %(user_id)s,
+                      (%(nouns)s::text[])[1 + g %% %(n_nouns)s] || ' ' || (%(brands)s::text[])[1 + (g / 7) %% %(n_brands)s],
+                      'Сдаю ' || (%(adjectives)s::text[])[1 + (g / 3) %% %(n_adj)s] || ' '
+                          || lower((%(nouns)s::text[])[1 + g %% %(n_nouns)s]) || ' в аренду, объявление ' || g,
+                      (%(categories)s::text[])[1 + g %% %(n_categories)s],
+                      100 + (g * 37) %% 5000,
+                      'Москва',
+                      'Хорошее',
+                      ARRAY[(%(adjectives)s::text[])[1 + (g / 5) %% %(n_adj)s], 'Комплект ' || (g %% 10)]
+               FROM generate_series(%(first)s, %(last)s) g""",
+            {
+                'user_id': user_id, 'nouns': NOUNS, 'brands': BRANDS, 'adjectives': ADJECTIVES,
+                'categories': CATEGORIES, 'n_nouns': len(NOUNS), 'n_brands': len(BRANDS),
+                'n_adj': len(ADJECTIVES), 'n_categories': len(CATEGORIES),
+                'first': start + 1, 'last': start + count,
+            }
+        )
+        conn.commit()
+        print(f'seeded {start + count}/{rows}')
+    cur.execute('ANALYZE items')
+    conn.commit()
+    cur.close()
+
+
+def run(conn, repeats, limit):
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    all_samples = []
+    for text in QUERIES:
+        samples = []
+        for _ in range(repeats):
+            query, args, _, _ = build_search_query({'q': text, 'limit': str(limit), 'fields': 'title,price,owner'})
+            started = time.perf_counter()
+            cur.execute(query, args)
+            cur.fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        report(f'q={text!r}', samples)
+        all_samples.extend(samples)
+    report('all queries', all_samples)
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], options=f'-c search_path={schema}')
+    try:
+        if not args.skip_seed:
+            seed(conn, args.rows)
+        run(conn, args.repeats, args.limit)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+'''Общие помощники бенчмарков'''
+import os
+import statistics
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def use_function(name: str):
+    '''Делает модули функции backend/<name> импортируемыми как в рантайме платформы.
+
+    Функции содержат одноимённые модули (db, sessions, ...), поэтому ранее
+    загруженные модули другой функции выгружаются.
+    '''
+    path = os.path.abspath(os.path.join(BACKEND_DIR, name))
+    for other in os.listdir(BACKEND_DIR):
+        other_path = os.path.abspath(os.path.join(BACKEND_DIR, other))
+        if other_path in sys.path and other_path != path:
+            sys.path.remove(other_path)
+    for module_name, module in list(sys.modules.items()):
+        # object.__getattribute__ не запускает загрузку модулей, отложенных через api.lazy_import
+        module_file = object.__getattribute__(module, '__dict__').get('__file__') or ''
+        if module_file.startswith(os.path.abspath(BACKEND_DIR)) and not module_file.startswith(path + os.sep):
+            del sys.modules[module_name]
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return path
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples) -> dict:
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+        'mean_ms': statistics.mean(samples),
+    }
+
+
+def report(name, samples):
+    s = summarize(samples)
+    print(f'{name:<28} p50={s["p50_ms"]:8.2f}ms  p95={s["p95_ms"]:8.2f}ms  '
+          f'p99={s["p99_ms"]:8.2f}ms  mean={s["mean_ms"]:8.2f}ms')
@@ -0,0 +1,424 @@
+'''Нагрузочный прогон функций auth, items и bookings на одноразовой базе Postgres.
+
+Создаёт временную базу на сервере из --dsn, применяет db_migrations/V*.sql, заполняет
+синтетическими пользователями, объявлениями и бронированиями и вызывает handler(event, context)
+каждой функции конкурентно по заданной смеси сценариев. Каждая функция работает в своих
+процессах, как на платформе, — одноимённые модули функций не пересекаются.
+
+Результат — JSON с p50/p95/p99, числом запросов к базе и строк на вызов по каждому сценарию;
+файлы двух прогонов сравниваются через --compare.
+
+Запуск:
+    python benchmarks/loadtest.py --dsn postgresql://postgres@localhost/postgres \\
+        --users 1000 --items 20000 --bookings 50000 --requests 5000 --output bench.json
+    python benchmarks/loadtest.py --compare old.json new.json
+'''
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import subprocess
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from common import use_function, summarize
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MIGRATIONS = os.path.join(ROOT_DIR, 'db_migrations', 'V*.sql')
+PASSWORD = 'benchpass'
+SEARCH_TERMS = ['дрель', 'палатка', 'велосипед', 'проектор', 'bosch', 'шуруповерт']
+BOOKING_BASE = date(2031, 1, 1)
+
+# сценарий: (функция, вес по умолчанию)
+SCENARIOS = {
+    'items_list': ('items', 30),
+    'items_search': ('items', 10),
+    'items_near': ('items', 10),
+    'items_create': ('items', 3),
+    'bookings_list': ('bookings', 10),
+    'bookings_owner': ('bookings', 5),
+    'bookings_availability': ('bookings', 15),
+    'bookings_free_items': ('bookings', 5),
+    'bookings_create': ('bookings', 5),
+    'auth_login': ('auth', 7),
+    'auth_verify': ('auth', 5),
+}
+
+
+def _psycopg2():
+    import psycopg2
+    from psycopg2 import extensions
+    return psycopg2, extensions
+
+
+def create_database(admin_dsn: str) -> tuple:
+    psycopg2, extensions = _psycopg2()
+    name = 'bench_' + uuid.uuid4().hex[:12]
+    conn = psycopg2.connect(admin_dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'CREATE DATABASE {name}')
+    conn.close()
+    return name, extensions.make_dsn(admin_dsn, dbname=name)
+
+
+def drop_database(admin_dsn: str, name: str):
+    psycopg2, _ = _psycopg2()
+    conn = psycopg2.connect(admin_dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS {name}')
+    conn.close()
+
+
+def apply_migrations(conn):
+    with conn.cursor() as cur:
+        for path in sorted(glob.glob(MIGRATIONS)):
+            with open(path, encoding='utf-8') as f:
+                cur.execute(f.read())
+    conn.commit()
+
+
+def seed(conn, users: int, items: int, bookings: int):
+    password_hash = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    with conn.cursor() as cur:
+        cur.execute(
+            """INSERT INTO users (email, password_hash, full_name, user_type)
+               SELECT 'bench' || g || '@example.com', %s, 'Пользователь ' || g,
+                      CASE WHEN g %% 3 = 0 THEN 'owner' ELSE 'renter' END
+               FROM generate_series(1, %s) g""",
+            (password_hash, users)
+        )
+        cur.execute(
+            """INSERT INTO user_sessions (user_id, session_token, expires_at)
+               SELECT id, 'bench-token-' || id, NOW() + INTERVAL '30 days' FROM users"""
+        )
+        cur.execute(
+            """INSERT INTO items (user_id, title, description, category_id, price, period, location, condition,
+                                  features, latitude, longitude)
+               SELECT u.min_id + (g %% %(users)s),
+                      (ARRAY['Дрель Bosch', 'Палатка Tramp', 'Велосипед Stels', 'Проектор Epson',
+                             'Шуруповёрт Makita', 'Лестница'])[1 + g %% 6] || ' №' || g,
+                      'Синтетическое объявление ' || g,
+                      (ARRAY['tools', 'electronics', 'sports', 'furniture', 'camping'])[1 + g %% 5],
+                      100 + (g * 37) %% 5000,
+                      (ARRAY['час', 'день', 'неделя'])[1 + g %% 3],
+                      'Москва',
+                      'Хорошее',
+                      ARRAY['Комплект ' || (g %% 10)],
+                      55.75 + (random() - 0.5) * 0.6,
+                      37.62 + (random() - 0.5) * 0.9
+               FROM generate_series(1, %(items)s) g, (SELECT min(id) AS min_id FROM users) u""",
+            {'users': users, 'items': items}
+        )
+        # Бронирования одной вещи идут непересекающимися окнами по 10 дней
+        cur.execute(
+            """INSERT INTO bookings (item_id, user_id, start_date, end_date, total_days, total_price, status)
+               SELECT i.min_id + (g %% %(items)s),
+                      u.min_id + (g %% %(users)s),
+                      %(base)s::date + (g / %(items)s) * 10,
+                      %(base)s::date + (g / %(items)s) * 10 + 3,
+                      4, 2000,
+                      (ARRAY['pending', 'confirmed', 'completed', 'cancelled'])[1 + g %% 4]
+               FROM generate_series(0, %(bookings)s - 1) g,
+                    (SELECT min(id) AS min_id FROM items) i,
+                    (SELECT min(id) AS min_id FROM users) u""",
+            {'items': items, 'users': users, 'bookings': bookings, 'base': BOOKING_BASE}
+        )
+        cur.execute('SELECT min(id), max(id) FROM users')
+        user_range = cur.fetchone()
+        cur.execute('SELECT min(id), max(id) FROM items')
+        item_range = cur.fetchone()
+    conn.commit()
+    with conn.cursor() as cur:
+        conn.autocommit = True
+        cur.execute('VACUUM ANALYZE')
+        conn.autocommit = False
+    return {'users': list(user_range), 'items': list(item_range),
+            'booking_slots': max(1, bookings // max(1, items)) + 1}
+
+
+def build_event(scenario: str, data: dict, rng: random.Random) -> dict:
+    user_id = rng.randint(*data['users'])
+    item_id = rng.randint(*data['items'])
+    auth_headers = {'X-Authorization': f'Bearer bench-token-{user_id}'}
+
+    if scenario == 'items_list':
+        params = {'limit': '20', 'fields': 'title,price,period,location,owner'}
+        if rng.random() < 0.5:
+            params['category'] = rng.choice(['tools', 'electronics', 'sports', 'furniture', 'camping'])
+        return {'httpMethod': 'GET', 'queryStringParameters': params, 'headers': {}}
+    if scenario == 'items_search':
+        return {'httpMethod': 'GET', 'headers': {},
+                'queryStringParameters': {'q': rng.choice(SEARCH_TERMS), 'limit': '20', 'fields': 'title,price'}}
+    if scenario == 'items_near':
+        near = f'{55.75 + rng.uniform(-0.2, 0.2):.5f},{37.62 + rng.uniform(-0.3, 0.3):.5f}'
+        return {'httpMethod': 'GET', 'headers': {},
+                'queryStringParameters': {'near': near, 'radius_km': str(rng.choice([2, 5, 10])), 'limit': '20'}}
+    if scenario == 'items_create':
+        body = {'title': 'Новая дрель', 'category_id': 'tools', 'price': 300, 'latitude': 55.7, 'longitude': 37.6}
+        return {'httpMethod': 'POST', 'headers': auth_headers, 'body': json.dumps(body)}
+    if scenario == 'bookings_list':
+        return {'httpMethod': 'GET', 'headers': auth_headers, 'queryStringParameters': {}}
+    if scenario == 'bookings_owner':
+        return {'httpMethod': 'GET', 'headers': auth_headers,
+                'queryStringParameters': {'role': 'owner', 'status': 'pending,confirmed', 'limit': '20'}}
+    if scenario == 'bookings_availability':
+        start = BOOKING_BASE + timedelta(days=rng.randint(0, 60))
+        return {'httpMethod': 'GET', 'headers': {}, 'queryStringParameters': {
+            'action': 'availability', 'item_id': str(item_id),
+            'start_date': start.isoformat(), 'end_date': (start + timedelta(days=30)).isoformat()}}
+    if scenario == 'bookings_free_items':
+        ids = ','.join(str(rng.randint(*data['items'])) for _ in range(20))
+        start = BOOKING_BASE + timedelta(days=rng.randint(0, 60))
+        return {'httpMethod': 'GET', 'headers': {}, 'queryStringParameters': {
+            'action': 'free_items', 'item_ids': ids,
+            'start_date': start.isoformat(), 'end_date': (start + timedelta(days=3)).isoformat()}}
+    if scenario == 'bookings_create':
+        # Даты после засеянных окон: часть запросов ожидаемо получит 409
+        start = BOOKING_BASE + timedelta(days=data['booking_slots'] * 10 + rng.randint(0, 200))
+        body = {'item_id': item_id, 'start_date': start.isoformat(),
+                'end_date': (start + timedelta(days=rng.randint(0, 5))).isoformat()}
+        return {'httpMethod': 'POST', 'headers': auth_headers, 'body': json.dumps(body)}
+    if scenario == 'auth_login':
+        index = user_id - data['users'][0] + 1
+        body = {'action': 'login', 'email': f'bench{index}@example.com', 'password': PASSWORD}
+        return {'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(body)}
+    if scenario == 'auth_verify':
+        body = {'action': 'verify', 'session_token': f'bench-token-{user_id}'}
+        return {'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(body)}
+    raise ValueError(scenario)
+
+
+# --- код воркера: выполняется в процессе конкретной функции ---
+
+_handler = None
+_counters = {'queries': 0, 'rows': 0}
+
+
+def _install_query_counter(db_module):
+    '''Оборачивает курсоры пула, чтобы считать запросы и строки на вызов'''
+    psycopg2, extensions = _psycopg2()
+
+    cursor_classes = {}
+
+    def counting_cursor(base):
+        if base not in cursor_classes:
+            class CountingCursor(base):
+                def execute(self, query, vars=None):
+                    result = super().execute(query, vars)
+                    _counters['queries'] += 1
+                    if self.rowcount > 0:
+                        _counters['rows'] += self.rowcount
+                    return result
+
+            cursor_classes[base] = CountingCursor
+        return cursor_classes[base]
+
+    def counting_connection(base):
+        class CountingConnection(base):
+            def cursor(self, *args, **kwargs):
+                factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+                kwargs['cursor_factory'] = counting_cursor(factory)
+                return super().cursor(*args, **kwargs)
+
+        return CountingConnection
+
+    original_connect = db_module.psycopg2.connect
+
+    def connect(*args, **kwargs):
+        # В режиме transaction пул передаёт свой класс соединения — счётчик наследуется от него
+        kwargs['connection_factory'] = counting_connection(kwargs.get('connection_factory') or extensions.connection)
+        return original_connect(*args, **kwargs)
+
+    db_module.psycopg2.connect = connect
+
+
+def init_worker(function: str, env: dict):
+    global _handler
+    os.environ.update(env)
+    use_function(function)
+    import db
+    import index
+    _install_query_counter(db)
+    _handler = index.handler
+
+
+def run_event(scenario: str, event: dict) -> tuple:
+    _counters['queries'] = _counters['rows'] = 0
+    started = time.perf_counter()
+    try:
+        status = _handler(event, None)['statusCode']
+    except Exception:
+        status = 'exception'
+    elapsed = (time.perf_counter() - started) * 1000
+    return scenario, status, elapsed, _counters['queries'], _counters['rows']
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+# --- оркестрация ---
+
+def parse_mix(text: str) -> dict:
+    if not text:
+        return {name: weight for name, (_, weight) in SCENARIOS.items()}
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f'Неизвестный сценарий: {name}')
+        mix[name] = float(weight)
+    return mix
+
+
+def db_tuple_stats(dsn: str) -> dict:
+    psycopg2, _ = _psycopg2()
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT xact_commit + xact_rollback, tup_returned, tup_fetched, blks_read, blks_hit
+               FROM pg_stat_database WHERE datname = current_database()"""
+        )
+        transactions, returned, fetched, read, hit = cur.fetchone()
+    conn.close()
+    return {'transactions': transactions, 'tup_returned': returned, 'tup_fetched': fetched,
+            'blks_read': read, 'blks_hit': hit}
+
+
+def run_load(dsn: str, data: dict, mix: dict, requests: int, concurrency: int, seed_value: int, env: dict) -> dict:
+    rng = random.Random(seed_value)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    plan = [rng.choices(names, weights)[0] for _ in range(requests)]
+
+    worker_env = {'DATABASE_URL': dsn, 'MAIN_DB_SCHEMA': 'public', 'DB_POOL_MIN': '1', 'DB_POOL_MAX': '1', **env}
+    pools = {}
+    for function in {SCENARIOS[name][0] for name in names}:
+        pools[function] = ProcessPoolExecutor(max_workers=concurrency, initializer=init_worker,
+                                              initargs=(function, worker_env))
+        list(pools[function].map(_warm_up, range(concurrency)))
+
+    before = db_tuple_stats(dsn)
+    started = time.perf_counter()
+    futures = [pools[SCENARIOS[name][0]].submit(run_event, name, build_event(name, data, rng)) for name in plan]
+    results = [future.result() for future in futures]
+    wall = time.perf_counter() - started
+    after = db_tuple_stats(dsn)
+    for pool in pools.values():
+        pool.shutdown()
+
+    by_scenario = defaultdict(list)
+    for result in results:
+        by_scenario[result[0]].append(result)
+
+    scenarios = {}
+    for name, rows in sorted(by_scenario.items()):
+        statuses = defaultdict(int)
+        for _, status, _, _, _ in rows:
+            statuses[str(status)] += 1
+        scenarios[name] = {
+            **summarize([r[2] for r in rows]),
+            'statuses': dict(statuses),
+            'queries_per_request': sum(r[3] for r in rows) / len(rows),
+            'rows_per_request': sum(r[4] for r in rows) / len(rows),
+        }
+
+    delta = {key: after[key] - before[key] for key in after}
+    return {
+        'wall_seconds': wall,
+        'throughput_rps': len(results) / wall if wall else 0.0,
+        'overall': summarize([r[2] for r in results]),
+        'scenarios': scenarios,
+        'database': {
+            **delta,
+            'tup_returned_per_request': delta['tup_returned'] / len(results),
+            'tup_fetched_per_request': delta['tup_fetched'] / len(results),
+        },
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{"scenario":<24}{"metric":<22}{"old":>12}{"new":>12}{"change":>10}')
+    for name in sorted(set(old['scenarios']) | set(new['scenarios'])):
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'rows_per_request'):
+            a = old['scenarios'].get(name, {}).get(metric)
+            b = new['scenarios'].get(name, {}).get(metric)
+            if a is None or b is None:
+                continue
+            change = f'{(b - a) / a * 100:+.1f}%' if a else 'n/a'
+            print(f'{name:<24}{metric:<22}{a:>12.2f}{b:>12.2f}{change:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'),
+                        help='сервер, на котором создаётся временная база')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=8, help='процессов на функцию')
+    parser.add_argument('--mix', default='', help='например items_list=50,auth_login=10')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-cache', action='store_true', help='отключить кэш ответов каталога')
+    parser.add_argument('--keep-db', action='store_true')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.dsn:
+        parser.error('нужен --dsn или BENCH_DATABASE_URL')
+
+    psycopg2, _ = _psycopg2()
+    name, dsn = create_database(args.dsn)
+    try:
+        conn = psycopg2.connect(dsn)
+        apply_migrations(conn)
+        data = seed(conn, args.users, args.items, args.bookings)
+        conn.close()
+
+        env = {'LISTING_CACHE_TTL': '0'} if args.no_cache else {}
+        mix = parse_mix(args.mix)
+        result = run_load(dsn, data, mix, args.requests, args.concurrency, args.seed, env)
+        result['meta'] = {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'config': {key: value for key, value in vars(args).items() if key not in ('dsn', 'compare')},
+            'mix': mix,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+        for scenario, stats in result['scenarios'].items():
+            print(f'{scenario:<24} p50={stats["p50_ms"]:7.2f}ms p95={stats["p95_ms"]:7.2f}ms '
+                  f'p99={stats["p99_ms"]:7.2f}ms q/req={stats["queries_per_request"]:.2f} '
+                  f'statuses={stats["statuses"]}')
+        print(f'throughput {result["throughput_rps"]:.1f} req/s, results in {args.output}')
+    finally:
+        if not args.keep_db:
+            drop_database(args.dsn, name)
+
+
+if __name__ == '__main__':
+    main()
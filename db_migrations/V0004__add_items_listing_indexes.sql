@@ -0,0 +1,7 @@
+-- Курсорная пагинация каталога идёт по (created_at, id), поэтому created_at не может быть NULL
+UPDATE items SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE items ALTER COLUMN created_at SET NOT NULL;
+
+-- Частичные индексы по активным объявлениям: каждая страница каталога читается диапазоном индекса
+CREATE INDEX IF NOT EXISTS idx_items_active_created ON items (created_at DESC, id DESC) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_items_active_category_created ON items (category_id, created_at DESC, id DESC) WHERE is_active = true;
@@ -0,0 +1,11 @@
+-- Отозванные подписанные токены (принудительный выход); строка живёт до истечения самого токена
+CREATE TABLE IF NOT EXISTS revoked_session_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    expires_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_session_tokens_expires_at ON revoked_session_tokens(expires_at);
+
+-- Очистка истёкших сессий выбирает строки по expires_at
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON user_sessions(expires_at);
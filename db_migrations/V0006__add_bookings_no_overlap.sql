@@ -0,0 +1,43 @@
+-- Атомарный запрет пересекающихся бронирований одной вещи
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- В таблице уже есть данные, нарушающие оба ограничения; без исправления ALTER TABLE упадёт.
+-- Перепутанные даты меняются местами: сама бронь осмысленна, ошибка в порядке полей
+UPDATE bookings SET start_date = end_date, end_date = start_date, updated_at = CURRENT_TIMESTAMP
+WHERE end_date < start_date;
+
+-- Из пересекающихся действующих броней одной вещи остаётся более ранняя (по id), поздние
+-- отменяются и выпадают из WHERE ограничения. Проход идёт по порядку id, поэтому бронь,
+-- пересекавшаяся только с уже отменённой, остаётся в силе
+DO $$
+DECLARE
+    candidate RECORD;
+BEGIN
+    FOR candidate IN
+        SELECT b.id, b.item_id, b.start_date, b.end_date FROM bookings b
+        WHERE b.status IN ('pending', 'confirmed', 'active')
+          AND EXISTS (
+              SELECT 1 FROM bookings e
+              WHERE e.item_id = b.item_id AND e.id < b.id AND e.status IN ('pending', 'confirmed', 'active')
+                AND daterange(e.start_date, e.end_date, '[]') && daterange(b.start_date, b.end_date, '[]')
+          )
+        ORDER BY b.item_id, b.id
+    LOOP
+        UPDATE bookings SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+        WHERE id = candidate.id AND EXISTS (
+            SELECT 1 FROM bookings e
+            WHERE e.item_id = candidate.item_id AND e.id < candidate.id AND e.status IN ('pending', 'confirmed', 'active')
+              AND daterange(e.start_date, e.end_date, '[]') && daterange(candidate.start_date, candidate.end_date, '[]')
+        );
+    END LOOP;
+END $$;
+
+ALTER TABLE bookings ADD CONSTRAINT bookings_dates_order CHECK (end_date >= start_date);
+
+-- Ограничение создаёт GiST-индекс по (item_id, daterange), он же обслуживает запросы занятости
+ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap
+    EXCLUDE USING gist (item_id WITH =, daterange(start_date, end_date, '[]') WITH &&)
+    WHERE (status IN ('pending', 'confirmed', 'active'));
+
+-- B-tree по датам без item_id запросам занятости не помогает
+DROP INDEX IF EXISTS idx_bookings_dates;
@@ -0,0 +1,19 @@
+-- Полнотекстовый поиск по объявлениям (русская морфология) и триграммы для опечаток
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- array_to_string не IMMUTABLE, поэтому документ собирается в функции, объявленной IMMUTABLE:
+-- для генерируемой колонки результат зависит только от аргументов
+CREATE OR REPLACE FUNCTION items_search_document(title TEXT, description TEXT, features TEXT[])
+RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A')
+        || setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'B')
+        || setweight(to_tsvector('russian'::regconfig, coalesce(array_to_string(features, ' '), '')), 'C')
+$$;
+
+ALTER TABLE items ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (items_search_document(title, description, features)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_items_search_vector ON items USING gin (search_vector) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_items_title_trgm ON items USING gin (title gin_trgm_ops) WHERE is_active = true;
@@ -0,0 +1,17 @@
+-- Координаты объявлений и сеточный индекс для поиска «рядом со мной» без PostGIS
+ALTER TABLE items ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+ALTER TABLE items ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+
+ALTER TABLE items ADD CONSTRAINT items_coordinates_range CHECK (
+    (latitude IS NULL AND longitude IS NULL)
+    OR (latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180)
+);
+
+-- Ячейка сетки 0.1° x 0.1° (~11 км по широте); формула совпадает с backend/items/geo.py
+ALTER TABLE items ADD COLUMN IF NOT EXISTS geo_cell INTEGER GENERATED ALWAYS AS (
+    least(floor((latitude + 90) * 10)::int, 1799) * 3600 + least(floor((longitude + 180) * 10)::int, 3599)
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_items_active_geo_cell ON items (geo_cell) WHERE is_active = true AND geo_cell IS NOT NULL;
+-- Для больших радиусов, когда ячеек слишком много, запрос идёт диапазоном по широте
+CREATE INDEX IF NOT EXISTS idx_items_active_latitude ON items (latitude) WHERE is_active = true AND latitude IS NOT NULL;
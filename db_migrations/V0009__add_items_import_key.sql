@@ -0,0 +1,4 @@
+-- Ключ строки массовой загрузки: "<ключ идемпотентности>:<номер строки>"; повтор запроса не создаёт дублей
+ALTER TABLE items ADD COLUMN IF NOT EXISTS import_key VARCHAR(160);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_items_user_import_key ON items (user_id, import_key) WHERE import_key IS NOT NULL;
@@ -0,0 +1,12 @@
+-- Курсорная пагинация бронирований идёт по (created_at, id), поэтому created_at не может быть NULL
+UPDATE bookings SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE bookings ALTER COLUMN created_at SET NOT NULL;
+
+-- Бронирования арендатора: каждая страница читается диапазоном индекса
+CREATE INDEX IF NOT EXISTS idx_bookings_user_created ON bookings (user_id, created_at DESC, id DESC);
+-- Бронирования вещей владельца с фильтром по статусу и датам
+CREATE INDEX IF NOT EXISTS idx_bookings_item_status_start ON bookings (item_id, status, start_date);
+
+-- Одноколоночные индексы покрываются составными
+DROP INDEX IF EXISTS idx_bookings_user_id;
+DROP INDEX IF EXISTS idx_bookings_item_id;
@@ -0,0 +1,7 @@
+-- Версия для оптимистичной блокировки: каждое изменение статуса увеличивает её на единицу
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+-- Частичные индексы для служебной задачи: каждый шаг читает только свои статусы
+CREATE INDEX IF NOT EXISTS idx_bookings_pending_created ON bookings (created_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_bookings_confirmed_start ON bookings (start_date) WHERE status = 'confirmed';
+CREATE INDEX IF NOT EXISTS idx_bookings_active_end ON bookings (end_date) WHERE status = 'active';
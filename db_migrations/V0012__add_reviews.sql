@@ -0,0 +1,18 @@
+-- Отзывы арендаторов о завершённых бронированиях: один отзыв на бронирование
+CREATE TABLE IF NOT EXISTS reviews (
+    id SERIAL PRIMARY KEY,
+    booking_id INTEGER NOT NULL UNIQUE REFERENCES bookings(id),
+    item_id INTEGER NOT NULL REFERENCES items(id),
+    author_id INTEGER NOT NULL REFERENCES users(id),
+    owner_id INTEGER NOT NULL REFERENCES users(id),
+    rating SMALLINT NOT NULL CHECK (rating BETWEEN 1 AND 5),
+    comment TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_reviews_item_created ON reviews (item_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_reviews_owner ON reviews (owner_id);
+
+-- Сумма оценок рядом с reviews_count: средний рейтинг пересчитывается при записи отзыва без агрегации
+ALTER TABLE items ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,20 @@
+-- Настройки цены объявления: скидки за срок, сезоны, залог (формат — в backend/bookings/pricing.py)
+ALTER TABLE items ADD COLUMN IF NOT EXISTS pricing JSONB;
+-- Версия цены — ключ кэша расчётов стоимости в функции bookings
+ALTER TABLE items ADD COLUMN IF NOT EXISTS price_version INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION items_bump_price_version() RETURNS trigger AS $$
+BEGIN
+    IF (NEW.price, NEW.period, NEW.pricing) IS DISTINCT FROM (OLD.price, OLD.period, OLD.pricing) THEN
+        NEW.price_version := OLD.price_version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER items_price_version
+    BEFORE UPDATE OF price, period, pricing ON items
+    FOR EACH ROW EXECUTE FUNCTION items_bump_price_version();
+
+-- Залог фиксируется в бронировании на момент создания
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS deposit INTEGER NOT NULL DEFAULT 0;
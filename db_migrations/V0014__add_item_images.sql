@@ -0,0 +1,25 @@
+-- Загруженные файлы по хэшу содержимого: один файл хранится и уменьшается один раз
+CREATE TABLE IF NOT EXISTS image_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    content_type VARCHAR(50) NOT NULL,
+    bytes INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    -- ширина -> URL миниатюры, плюс original
+    variants JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS item_images (
+    id SERIAL PRIMARY KEY,
+    item_id INTEGER NOT NULL REFERENCES items(id),
+    sha256 CHAR(64) NOT NULL REFERENCES image_blobs(sha256),
+    position INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (item_id, sha256)
+);
+
+CREATE INDEX IF NOT EXISTS idx_item_images_item_position ON item_images (item_id, position);
+
+-- Миниатюры обложки для каталога; image_url указывает на вариант для карточки
+ALTER TABLE items ADD COLUMN IF NOT EXISTS image_variants JSONB;
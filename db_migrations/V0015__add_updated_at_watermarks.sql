@@ -0,0 +1,18 @@
+-- Инкрементальная выгрузка идёт по (updated_at, id), поэтому updated_at обязателен и обновляется при любом UPDATE
+UPDATE items SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+ALTER TABLE items ALTER COLUMN updated_at SET NOT NULL;
+UPDATE bookings SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+ALTER TABLE bookings ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER items_set_updated_at BEFORE UPDATE ON items FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+CREATE TRIGGER bookings_set_updated_at BEFORE UPDATE ON bookings FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_items_updated ON items (updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_updated ON bookings (updated_at, id);
@@ -0,0 +1,11 @@
+-- Счётчики ограничения попыток входа: UNLOGGED — без записи в WAL, после сбоя таблица очищается,
+-- что для окон в минуты допустимо
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_counters (
+    key TEXT NOT NULL,
+    window_start BIGINT NOT NULL,
+    count INTEGER NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (key, window_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_counters_expires ON rate_limit_counters (expires_at);
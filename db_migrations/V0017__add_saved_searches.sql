@@ -0,0 +1,52 @@
+-- Сохранённые поиски арендаторов: уведомление, когда подходящая вещь появилась или освободилась
+CREATE TABLE IF NOT EXISTS saved_searches (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    category_id VARCHAR(50) REFERENCES categories(id),
+    price_min INTEGER,
+    price_max INTEGER,
+    location VARCHAR(255),
+    start_date DATE,
+    end_date DATE,
+    is_active BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches (user_id) WHERE is_active = true;
+
+-- Инвертированный индекс: (категория или '*', ценовая корзина) -> поиск.
+-- Корзины считаются по границам matcher.PRICE_BOUNDS
+CREATE TABLE IF NOT EXISTS saved_search_index (
+    category_key VARCHAR(50) NOT NULL,
+    price_bucket SMALLINT NOT NULL,
+    search_id INTEGER NOT NULL REFERENCES saved_searches(id),
+    PRIMARY KEY (category_key, price_bucket, search_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_saved_search_index_search ON saved_search_index (search_id);
+
+-- Вещи, которые нужно сверить с сохранёнными поисками
+CREATE TABLE IF NOT EXISTS match_queue (
+    id BIGSERIAL PRIMARY KEY,
+    item_id INTEGER NOT NULL,
+    reason VARCHAR(20) NOT NULL CHECK (reason IN ('new_item', 'freed')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    saved_search_id INTEGER NOT NULL REFERENCES saved_searches(id),
+    item_id INTEGER NOT NULL REFERENCES items(id),
+    reason VARCHAR(20) NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- Пока уведомление о вещи не отправлено, повторное совпадение его не дублирует
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_outbox_pending
+    ON notification_outbox (saved_search_id, item_id) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_unsent ON notification_outbox (id) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_user ON notification_outbox (user_id, id DESC);
@@ -0,0 +1,110 @@
+'''Проверка и синхронизация общих модулей функций.
+
+Каждая функция в backend/ деплоится отдельно, поэтому общие модули лежат копиями
+в каталоге каждой функции, которой они нужны. Скрипт сверяет копии по sha256 и
+завершается с кодом 1, если какая-то отличается или отсутствует:
+
+    python scripts/check_shared_modules.py
+
+После правки одной копии разнести её по остальным:
+
+    python scripts/check_shared_modules.py --sync items
+'''
+import argparse
+import difflib
+import hashlib
+import os
+import shutil
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# модуль -> функции, в каталоге которых лежит его копия
+SHARED_MODULES = {
+    'api.py': ('auth', 'items', 'bookings'),
+    'db.py': ('auth', 'items', 'bookings'),
+    'tracing.py': ('auth', 'items', 'bookings'),
+    'sessions.py': ('auth', 'items', 'bookings'),
+    'tokens.py': ('auth', 'items', 'bookings'),
+    'pricing.py': ('items', 'bookings'),
+    'export.py': ('items', 'bookings'),
+    'matcher.py': ('items', 'bookings'),
+}
+
+
+def _path(function: str, module: str) -> str:
+    return os.path.normpath(os.path.join(BACKEND_DIR, function, module))
+
+
+def _digest(path: str):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _diff(reference: str, other: str) -> str:
+    with open(reference, encoding='utf-8') as f:
+        a = f.readlines()
+    with open(other, encoding='utf-8') as f:
+        b = f.readlines()
+    lines = list(difflib.unified_diff(a, b, os.path.relpath(reference), os.path.relpath(other)))
+    return ''.join(lines[:40]) + ('...\n' if len(lines) > 40 else '')
+
+
+def check() -> list:
+    '''Список описаний расхождений; пустой — все копии совпадают'''
+    problems = []
+    for module, functions in SHARED_MODULES.items():
+        reference = _path(functions[0], module)
+        expected = _digest(reference)
+        if expected is None:
+            problems.append(f'{os.path.relpath(reference)}: файл отсутствует\n')
+            continue
+        for function in functions[1:]:
+            path = _path(function, module)
+            actual = _digest(path)
+            if actual is None:
+                problems.append(f'{os.path.relpath(path)}: файл отсутствует\n')
+            elif actual != expected:
+                problems.append(_diff(reference, path))
+    return problems
+
+
+def sync(source: str) -> list:
+    '''Копирует модули из каталога функции source в остальные; возвращает изменённые пути'''
+    changed = []
+    for module, functions in SHARED_MODULES.items():
+        if source not in functions:
+            continue
+        origin = _path(source, module)
+        expected = _digest(origin)
+        for function in functions:
+            path = _path(function, module)
+            if function != source and _digest(path) != expected:
+                shutil.copyfile(origin, path)
+                changed.append(os.path.relpath(path))
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync', metavar='FUNCTION', help='разнести копии из каталога этой функции')
+    args = parser.parse_args()
+
+    if args.sync:
+        for path in sync(args.sync):
+            print(f'обновлён {path}')
+    problems = check()
+    for problem in problems:
+        sys.stdout.write(problem)
+    if problems:
+        print(f'Расходятся копии общих модулей: {len(problems)}. '
+              'Синхронизируйте: python scripts/check_shared_modules.py --sync <функция>')
+        sys.exit(1)
+    print('Копии общих модулей совпадают')
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,9 @@ interface ItemsGridProps {
   onCategoryChange: (categoryId: string) => void;
   userType: 'renter' | 'owner';
   onUserTypeChange: (type: 'renter' | 'owner') => void;
+  hasMore?: boolean;
+  loadingMore?: boolean;
+  onLoadMore?: () => void;
 }
 
 const ItemsGrid = ({ 
@@ -41,7 +44,10 @@ const ItemsGrid = ({
   selectedCategory, 
   onCategoryChange,
   userType,
-  onUserTypeChange
+  onUserTypeChange,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore
 }: ItemsGridProps) => {
   const navigate = useNavigate();
   
@@ -140,6 +146,14 @@ const ItemsGrid = ({
                 </Card>
               ))}
             </div>
+
+            {hasMore && onLoadMore && (
+              <div className="flex justify-center">
+                <Button variant="outline" size="lg" onClick={onLoadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                </Button>
+              </div>
+            )}
           </TabsContent>
 
           <TabsContent value="owner" className="space-y-6">
@@ -174,6 +188,14 @@ const ItemsGrid = ({
                 </Card>
               ))}
             </div>
+
+            {hasMore && onLoadMore && (
+              <div className="flex justify-center">
+                <Button variant="outline" size="lg" onClick={onLoadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                </Button>
+              </div>
+            )}
           </TabsContent>
         </Tabs>
       </div>
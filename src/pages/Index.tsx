@@ -26,6 +26,9 @@ interface Item {
   condition: string;
 }
 
+const ITEMS_URL = 'https://functions.poehali.dev/916b95b6-3d7c-485f-996b-df65abfbe772';
+const PAGE_SIZE = 24;
+
 const Index = () => {
   const [user, setUser] = useState<User | null>(null);
   const [sessionToken, setSessionToken] = useState<string | null>(null);
@@ -34,6 +37,8 @@ const Index = () => {
   const [selectedCategory, setSelectedCategory] = useState<string>('all');
   const [items, setItems] = useState<Item[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const token = localStorage.getItem('session_token');
@@ -42,15 +47,26 @@ const Index = () => {
       setSessionToken(token);
       setUser(JSON.parse(userData));
     }
-    loadItems();
   }, []);
 
-  const loadItems = async () => {
+  useEffect(() => {
+    loadItems(selectedCategory);
+  }, [selectedCategory]);
+
+  const loadItems = async (category: string, cursor?: string) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (category !== 'all') {
+      params.set('category', category);
+    }
+    if (cursor) {
+      params.set('cursor', cursor);
+      setLoadingMore(true);
+    }
     try {
-      const response = await fetch('https://functions.poehali.dev/916b95b6-3d7c-485f-996b-df65abfbe772');
+      const response = await fetch(`${ITEMS_URL}?${params}`);
       if (response.ok) {
         const data = await response.json();
-        const formattedItems = data.map((item: Record<string, unknown>) => ({
+        const formattedItems = data.items.map((item: Record<string, unknown>) => ({
           id: item.id,
           title: item.title,
           category: item.category_id,
@@ -63,13 +79,18 @@ const Index = () => {
           owner: item.owner,
           condition: item.condition || 'Хорошее'
         }));
-        setItems(formattedItems);
+        setItems(prev => cursor ? [...prev, ...formattedItems] : formattedItems);
+        setNextCursor(data.next_cursor);
       }
     } catch (error) {
       console.error('Failed to load items:', error);
-      setItems(mockItems);
+      if (!cursor) {
+        setItems(mockItems);
+        setNextCursor(null);
+      }
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -202,6 +223,9 @@ const Index = () => {
           onCategoryChange={setSelectedCategory}
           userType={userType}
           onUserTypeChange={setUserType}
+          hasMore={nextCursor !== null}
+          loadingMore={loadingMore}
+          onLoadMore={() => nextCursor && loadItems(selectedCategory, nextCursor)}
         />
       )}
 
@@ -32,11 +32,16 @@ interface Booking {
   owner_name: string;
 }
 
+const BOOKINGS_URL = 'https://functions.poehali.dev/9129fc38-44a6-41c3-a36b-ec8a54dae1a6';
+const PAGE_SIZE = 20;
+
 const Profile = () => {
   const navigate = useNavigate();
   const [user, setUser] = useState<User | null>(null);
   const [bookings, setBookings] = useState<Booking[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const token = localStorage.getItem('session_token');
@@ -51,9 +56,14 @@ const Profile = () => {
     loadBookings(token);
   }, [navigate]);
 
-  const loadBookings = async (token: string) => {
+  const loadBookings = async (token: string, cursor?: string) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (cursor) {
+      params.set('cursor', cursor);
+      setLoadingMore(true);
+    }
     try {
-      const response = await fetch('https://functions.poehali.dev/9129fc38-44a6-41c3-a36b-ec8a54dae1a6', {
+      const response = await fetch(`${BOOKINGS_URL}?${params}`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
@@ -61,12 +71,21 @@ const Profile = () => {
       
       if (response.ok) {
         const data = await response.json();
-        setBookings(data);
+        setBookings(prev => cursor ? [...prev, ...data.items] : data.items);
+        setNextCursor(data.next_cursor);
       }
     } catch (error) {
       console.error('Failed to load bookings:', error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  const loadMoreBookings = () => {
+    const token = localStorage.getItem('session_token');
+    if (token && nextCursor) {
+      loadBookings(token, nextCursor);
     }
   };
 
@@ -212,6 +231,13 @@ const Profile = () => {
                         </div>
                       </Card>
                     ))}
+                    {nextCursor && (
+                      <div className="flex justify-center pt-2">
+                        <Button variant="outline" onClick={loadMoreBookings} disabled={loadingMore}>
+                          {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 )}
               </CardContent>